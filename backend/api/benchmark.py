@@ -159,10 +159,26 @@ def run_benchmark_from_file(
     answers = []
     contexts = []
     
+    # Retrieve for all questions at once (one embedding pass); on failure each question retrieves on its own
+    try:
+        if request.use_reranking and reranker:
+            batch_docs = retriever.retrieve_batch_with_reranking(
+                user_id=current_user.id,
+                queries=questions,
+                reranker=reranker
+            )
+        else:
+            batch_docs = retriever.retrieve_batch(queries=questions)
+    except Exception as e:
+        logger.warning(f"Batch retrieval failed, retrieving per question: {e}")
+        batch_docs = None
+    
     for i, question in enumerate(questions):
         try:
             # Retrieve
-            if request.use_reranking and reranker:
+            if batch_docs is not None:
+                retrieved_docs = batch_docs[i]
+            elif request.use_reranking and reranker:
                 retrieved_docs = retriever.retrieve_with_reranking(
                     user_id=current_user.id,
                     query=question,
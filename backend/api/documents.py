@@ -1,7 +1,11 @@
 """Document management endpoints."""
 import os
 import shutil
+import threading
 import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
@@ -10,7 +14,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import time
 
-from database.database import get_db
+from database.database import get_db, SessionLocal
 from database.models import Document
 from database.crud import (
     create_document,
@@ -27,6 +31,7 @@ from src.ingestion.pdf_processor_advanced import PDFProcessorAdvanced
 from src.chunking.chunker import Chunker
 from src.embeddings.embedder import Embedder
 from src.index.vector_store import VectorStore
+from src.retrieval.scoring import keyword_flag_metadata
 from logging_config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -43,6 +48,14 @@ embedder = Embedder()
 vector_store = VectorStore()
 chunker = Chunker()
 
+# All ingestions (background tasks and the synchronous endpoints) run on this single worker,
+# one at a time, so they don't write to the vector store concurrently
+_ingest_executor = ThreadPoolExecutor(max_workers=1)
+_ingest_tasks: "OrderedDict[str, dict]" = OrderedDict()
+_ingest_tasks_lock = threading.Lock()
+# Finished tasks kept for polling
+INGEST_TASK_HISTORY = 1000
+
 
 class DocumentResponse(BaseModel):
     id: int
@@ -58,6 +71,10 @@ class DocumentResponse(BaseModel):
         populate_by_name = True
 
 
+class BulkDeleteRequest(BaseModel):
+    document_ids: List[int]
+
+
 class ChunkResponse(BaseModel):
     id: str
     page_number: int
@@ -79,25 +96,13 @@ def document_to_response(document: Document) -> DocumentResponse:
     )
 
 
-@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
-async def upload_document(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    """Upload a document."""
-    # Check file size
-    file_content = await file.read()
-    if len(file_content) > MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size: {MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
+def store_upload(db: Session, filename: str, file_content: bytes) -> Document:
+    """Save uploaded file content and create its document record."""
     # Create upload directory (no user-specific subdirectories)
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     
     # Generate unique filename
-    file_extension = Path(file.filename).suffix
+    file_extension = Path(filename).suffix
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     file_path = UPLOAD_DIR / unique_filename
     
@@ -111,7 +116,7 @@ async def upload_document(
     # Create document record
     document = create_document(
         db=db,
-        filename=file.filename,
+        filename=filename,
         file_path=str(file_path),
         file_type=file_type,
         file_size=len(file_content)
@@ -119,9 +124,169 @@ async def upload_document(
     
     logger.info(f"Uploaded document {document.id}")
     
+    return document
+
+
+def remove_document(db: Session, document: Document):
+    """Delete a document's file and database record."""
+    # Delete file
+    if os.path.exists(document.file_path):
+        os.remove(document.file_path)
+    
+    # Delete from database
+    delete_document(db, document.id)
+    
+    logger.info(f"Deleted document {document.id}")
+
+
+def index_document(db: Session, document: Document) -> int:
+    """Chunk, embed and add a document to the vector store; returns the number of chunks."""
+    # Load document based on type
+    if document.file_type == "pdf":
+        processor = PDFProcessorAdvanced(
+            remove_headers_footers=True,
+            output_format="markdown"  # Markdown preserves table structure better
+        )
+        doc_data = processor.process_pdf(document.file_path)
+        pages_data = doc_data.get("pages", [])
+        
+        # Chunk pages
+        chunks = chunker.chunk_pages(pages_data, document.id)
+    else:
+        # Load other file types
+        loader = DocumentLoader()
+        doc_data = loader.load_document(document.file_path)
+        
+        # Chunk text
+        chunks = chunker.chunk_text(
+            text=doc_data["text"],
+            document_id=document.id,
+            page_number=1
+        )
+    
+    # Create chunks in database and prepare for embedding
+    texts = []
+    embeddings_list = []
+    metadatas = []
+    ids = []
+    
+    for chunk in chunks:
+        # Save chunk to database
+        create_chunk(
+            db=db,
+            chunk_id=chunk["id"],
+            document_id=document.id,
+            page_number=chunk["page_number"],
+            text=chunk["text"],
+            chunk_index=chunk["chunk_index"],
+            bbox=chunk.get("bbox")
+        )
+        
+        # Prepare for vector store
+        texts.append(chunk["text"])
+        metadatas.append({
+            "document_id": document.id,
+            "page_number": chunk["page_number"],
+            "chunk_index": chunk["chunk_index"],
+            # Source filename lets retrieval match model/generation hints without a DB lookup
+            "source": document.filename,
+            **keyword_flag_metadata(chunk["text"])
+        })
+        ids.append(chunk["id"])
+    
+    # Generate embeddings
+    embeddings_list = embedder.embed_texts(texts)
+    
+    # Add to vector store
+    vector_store.add_documents(
+        texts=texts,
+        embeddings=embeddings_list,
+        metadatas=metadatas,
+        ids=ids
+    )
+    
+    return len(chunks)
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Content of an uploaded file; gzip-compressed parts (clients compress text formats) are decompressed."""
+    file_content = await file.read()
+    if file.content_type == "application/gzip":
+        # Decompress at most one byte past the limit, so the size check still rejects oversized files
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            file_content = decompressor.decompress(file_content, MAX_UPLOAD_SIZE + 1)
+        except zlib.error as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid gzip data: {e}"
+            )
+        # A stream that ends early would otherwise be stored as a partial file
+        if not decompressor.eof and len(file_content) <= MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Truncated gzip data"
+            )
+    return file_content
+
+
+@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """Upload a document."""
+    # Check file size
+    file_content = await read_upload(file)
+    if len(file_content) > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {MAX_UPLOAD_SIZE / 1024 / 1024}MB"
+        )
+    
+    document = store_upload(db, file.filename, file_content)
     return document_to_response(document)
 
 
+@router.post("/upload-bulk", status_code=status.HTTP_200_OK)
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """Upload several documents in one request; errors are reported per file."""
+    results = {
+        "success": [],
+        "errors": [],
+        "total": len(files)
+    }
+    
+    for file in files:
+        try:
+            file_content = await read_upload(file)
+            if len(file_content) > MAX_UPLOAD_SIZE:
+                results["errors"].append({
+                    "filename": file.filename,
+                    "error": f"File too large. Maximum size: {MAX_UPLOAD_SIZE / 1024 / 1024}MB"
+                })
+                continue
+            
+            document = store_upload(db, file.filename, file_content)
+            results["success"].append(document_to_response(document))
+        except HTTPException as e:
+            results["errors"].append({
+                "filename": file.filename,
+                "error": e.detail
+            })
+        except Exception as e:
+            logger.error(f"Error uploading {file.filename}: {e}")
+            results["errors"].append({
+                "filename": file.filename,
+                "error": str(e)
+            })
+    
+    return results
+
+
 @router.get("", response_model=List[DocumentResponse])
 def list_documents(
     db: Session = Depends(get_db)
@@ -159,15 +324,35 @@ def delete_document_endpoint(
             detail="Document not found"
         )
     
-    # Delete file
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
+    remove_document(db, document)
+    return None
+
+
+@router.post("/delete-bulk", status_code=status.HTTP_200_OK)
+def delete_documents(
+    request: BulkDeleteRequest,
+    db: Session = Depends(get_db)
+):
+    """Delete several documents; errors are reported per document."""
+    results = {
+        "deleted": [],
+        "errors": []
+    }
     
-    # Delete from database
-    delete_document(db, document_id)
+    for document_id in request.document_ids:
+        try:
+            document = get_document_by_id(db, document_id)
+            if not document:
+                results["errors"].append({"document_id": document_id, "error": "Document not found"})
+                continue
+            
+            remove_document(db, document)
+            results["deleted"].append(document_id)
+        except Exception as e:
+            logger.error(f"Error deleting document {document_id}: {e}")
+            results["errors"].append({"document_id": document_id, "error": str(e)})
     
-    logger.info(f"Deleted document {document_id}")
-    return None
+    return results
 
 
 @router.post("/ingest-all", status_code=status.HTTP_200_OK)
@@ -175,6 +360,12 @@ def ingest_all_documents(
     db: Session = Depends(get_db)
 ):
     """Ingest all non-indexed documents."""
+    # Queued behind running ingest tasks; the request waits for the result
+    return _ingest_executor.submit(_ingest_all_documents, db=db).result()
+
+
+def _ingest_all_documents(db: Session):
+    """Ingest all non-indexed documents (runs on the ingest worker)."""
     # Get all non-indexed documents
     all_documents = get_all_documents(db)
     non_indexed_docs = [doc for doc in all_documents if doc.status != "indexed"]
@@ -199,66 +390,7 @@ def ingest_all_documents(
             
             update_document_status(db, document_id=document.id, status="processing")
             
-            # Load document based on type
-            if document.file_type == "pdf":
-                processor = PDFProcessorAdvanced(
-                    remove_headers_footers=True,
-                    output_format="markdown"  # Markdown preserves table structure better
-                )
-                doc_data = processor.process_pdf(document.file_path)
-                pages_data = doc_data.get("pages", [])
-                
-                # Chunk pages
-                chunks = chunker.chunk_pages(pages_data, document.id)
-            else:
-                # Load other file types
-                loader = DocumentLoader()
-                doc_data = loader.load_document(document.file_path)
-                
-                # Chunk text
-                chunks = chunker.chunk_text(
-                    text=doc_data["text"],
-                    document_id=document.id,
-                    page_number=1
-                )
-            
-            # Create chunks in database and prepare for embedding
-            texts = []
-            embeddings_list = []
-            metadatas = []
-            ids = []
-            
-            for chunk in chunks:
-                # Save chunk to database
-                create_chunk(
-                    db=db,
-                    chunk_id=chunk["id"],
-                    document_id=document.id,
-                    page_number=chunk["page_number"],
-                    text=chunk["text"],
-                    chunk_index=chunk["chunk_index"],
-                    bbox=chunk.get("bbox")
-                )
-                
-                # Prepare for vector store
-                texts.append(chunk["text"])
-                metadatas.append({
-                    "document_id": document.id,
-                    "page_number": chunk["page_number"],
-                    "chunk_index": chunk["chunk_index"]
-                })
-                ids.append(chunk["id"])
-            
-            # Generate embeddings
-            embeddings_list = embedder.embed_texts(texts)
-            
-            # Add to vector store
-            vector_store.add_documents(
-                texts=texts,
-                embeddings=embeddings_list,
-                metadatas=metadatas,
-                ids=ids
-            )
+            chunks_count = index_document(db, document)
             
             # Update document status
             update_document_status(db, document.id, "indexed")
@@ -266,10 +398,10 @@ def ingest_all_documents(
             results["success"].append({
                 "document_id": document.id,
                 "filename": document.filename,
-                "chunks_count": len(chunks)
+                "chunks_count": chunks_count
             })
             
-            logger.info(f"Ingested document {document.id} ({document.filename}) with {len(chunks)} chunks")
+            logger.info(f"Ingested document {document.id} ({document.filename}) with {chunks_count} chunks")
         
         except Exception as e:
             update_document_status(db, document.id, "error")
@@ -295,6 +427,12 @@ def ingest_document(
     db: Session = Depends(get_db)
 ):
     """Ingest a document into the vector store."""
+    # Queued behind running ingest tasks; the request waits for the result
+    return _ingest_executor.submit(_ingest_document, document_id, db=db).result()
+
+
+def _ingest_document(document_id: int, db: Session):
+    """Ingest a document into the vector store (runs on the ingest worker)."""
     document = get_document_by_id(db, document_id)
     if not document:
         raise HTTPException(
@@ -308,76 +446,17 @@ def ingest_document(
     try:
         update_document_status(db, document_id, "processing")
         
-        # Load document based on type
-        if document.file_type == "pdf":
-            processor = PDFProcessorAdvanced(
-                remove_headers_footers=True,
-                output_format="markdown"  # Markdown preserves table structure better
-            )
-            doc_data = processor.process_pdf(document.file_path)
-            pages_data = doc_data.get("pages", [])
-            
-            # Chunk pages
-            chunks = chunker.chunk_pages(pages_data, document_id)
-        else:
-            # Load other file types
-            loader = DocumentLoader()
-            doc_data = loader.load_document(document.file_path)
-            
-            # Chunk text
-            chunks = chunker.chunk_text(
-                text=doc_data["text"],
-                document_id=document_id,
-                page_number=1
-            )
-        
-        # Create chunks in database and prepare for embedding
-        texts = []
-        embeddings_list = []
-        metadatas = []
-        ids = []
-        
-        for chunk in chunks:
-            # Save chunk to database
-            create_chunk(
-                db=db,
-                chunk_id=chunk["id"],
-                document_id=document_id,
-                page_number=chunk["page_number"],
-                text=chunk["text"],
-                chunk_index=chunk["chunk_index"],
-                bbox=chunk.get("bbox")
-            )
-            
-            # Prepare for vector store
-            texts.append(chunk["text"])
-            metadatas.append({
-                "document_id": document_id,
-                "page_number": chunk["page_number"],
-                "chunk_index": chunk["chunk_index"]
-            })
-            ids.append(chunk["id"])
-        
-        # Generate embeddings
-        embeddings_list = embedder.embed_texts(texts)
-        
-        # Add to vector store
-        vector_store.add_documents(
-            texts=texts,
-            embeddings=embeddings_list,
-            metadatas=metadatas,
-            ids=ids
-        )
+        chunks_count = index_document(db, document)
         
         # Update document status
         update_document_status(db, document_id, "indexed")
         
-        logger.info(f"Ingested document {document_id} with {len(chunks)} chunks")
+        logger.info(f"Ingested document {document_id} with {chunks_count} chunks")
         
         return {
             "message": "Document ingested successfully",
             "document_id": document_id,
-            "chunks_count": len(chunks)
+            "chunks_count": chunks_count
         }
     
     except Exception as e:
@@ -389,6 +468,68 @@ def ingest_document(
         )
 
 
+def _run_ingest_task(task_id: str, func, *args):
+    """Run an ingest function with its own session and store its result on the task."""
+    db = SessionLocal()
+    try:
+        update = {"result": func(*args, db=db)}
+    except HTTPException as e:
+        update = {"error": e.detail}
+    except Exception as e:
+        logger.error(f"Ingest task {task_id} failed: {e}")
+        update = {"error": str(e)}
+    finally:
+        db.close()
+    with _ingest_tasks_lock:
+        _ingest_tasks[task_id].update(update, done=True)
+
+
+def submit_ingest_task(func, *args) -> str:
+    """Queue an ingest function on the ingest worker; returns the task id."""
+    task_id = uuid.uuid4().hex
+    with _ingest_tasks_lock:
+        _ingest_tasks[task_id] = {"task_id": task_id, "done": False, "result": None, "error": None}
+        # Forget the oldest finished tasks
+        finished = [tid for tid, task in _ingest_tasks.items() if task["done"]]
+        for old_id in finished[:max(0, len(_ingest_tasks) - INGEST_TASK_HISTORY)]:
+            del _ingest_tasks[old_id]
+    _ingest_executor.submit(_run_ingest_task, task_id, func, *args)
+    return task_id
+
+
+@router.post("/{document_id}/ingest-task", status_code=status.HTTP_202_ACCEPTED)
+def start_ingest_task(
+    document_id: int,
+    db: Session = Depends(get_db)
+):
+    """Start ingesting a document in the background; poll /tasks/{task_id} for the result."""
+    if not get_document_by_id(db, document_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    return {"task_id": submit_ingest_task(_ingest_document, document_id)}
+
+
+@router.post("/ingest-all-task", status_code=status.HTTP_202_ACCEPTED)
+def start_ingest_all_task():
+    """Start ingesting all non-indexed documents in the background; poll /tasks/{task_id} for the result."""
+    return {"task_id": submit_ingest_task(_ingest_all_documents)}
+
+
+@router.get("/tasks/{task_id}")
+def get_ingest_task(task_id: str):
+    """State of a background ingest task (done, result or error)."""
+    with _ingest_tasks_lock:
+        task = _ingest_tasks.get(task_id)
+        if task is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task not found"
+            )
+        return dict(task)
+
+
 @router.get("/{document_id}/preview")
 def preview_document(
     document_id: int,
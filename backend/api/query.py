@@ -1,13 +1,16 @@
 """RAG query endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
+import json
 import time
 
-from database.database import get_db
+from database.database import get_db, SessionLocal
 from database.crud import create_query_history, get_query_history
 from src.retrieval.retriever import Retriever
+from src.retrieval.query_features import classify_query
 from src.rerank.reranker import Reranker
 from src.qa.chain import QAChain
 from src.index.vector_store import VectorStore
@@ -18,6 +21,13 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/query", tags=["query"])
 
+# Queries containing these terms skip reranking (narrower than the retriever's spec detection)
+# The reranker might be prioritizing title chunks over technical specification chunks
+DIRECT_RETRIEVAL_KEYWORDS = (
+    "spezifikation", "specification", "specs", "technische", "hardware",
+    "wieviel", "wie viel", "welche", "was ist"
+)
+
 # Initialize components (lazy loading for reranker)
 vector_store = VectorStore()
 embedder = Embedder()
@@ -69,6 +79,120 @@ class QueryHistoryItem(BaseModel):
     query_metadata: Optional[dict] = None  # Include metadata with response times
 
 
+def _retrieve_docs(request: QueryRequest) -> List[dict]:
+    """Retrieve the documents for a query (reranked or direct retrieval, depending on the query type)."""
+    # For specification queries, try without reranking first to see if it helps
+    # The query is classified once; the retriever reuses the memoized classification
+    features = classify_query(request.query)
+    
+    # Processor questions often need multiple chunks because processor tables can span multiple chunks,
+    # and screen-to-body ratio questions may need more chunks to find the ratio information
+    is_processor_query = features.is_processor_query
+    is_screen_to_body_query = features.is_screen_to_body_query
+    
+    # Processor queries and screen-to-body queries are also spec queries
+    is_spec_query = (
+        is_processor_query
+        or is_screen_to_body_query
+        or any(keyword in features.query_lower for keyword in DIRECT_RETRIEVAL_KEYWORDS)
+    )
+    
+    logger.info(f"Query classification: is_spec_query={is_spec_query}, is_processor_query={is_processor_query}, is_screen_to_body_query={is_screen_to_body_query}, use_reranking={request.use_reranking}")
+    
+    if request.use_reranking and not is_spec_query:
+        # Use reranking for non-spec queries
+        # Use user_id=1 as default since vector store is global
+        # For processor queries or screen-to-body queries, pass higher n_results to get more chunks
+        n_results_for_retrieval = 50 if (is_processor_query or is_screen_to_body_query) else None
+        retrieved_docs = retriever.retrieve_with_reranking(
+            user_id=1,
+            query=request.query,
+            reranker=get_reranker(),
+            n_results=n_results_for_retrieval
+        )
+    else:
+        # For spec queries (including processor queries and screen-to-body queries), use direct retrieval without reranking
+        # This helps find technical chunks that might be ranked lower by the reranker
+        # Get even more results for general spec queries to ensure Display, Battery, Dimensions are found
+        # For processor queries, get even more chunks (80-100) because tables can span multiple chunks
+        # For screen-to-body queries, also get more chunks (50-80) to find ratio information
+        if is_processor_query:
+            n_results_for_retrieval = 100
+        elif is_screen_to_body_query:
+            n_results_for_retrieval = 80
+        else:
+            n_results_for_retrieval = 50
+        logger.info(f"Using direct retrieval (no reranking) with n_results={n_results_for_retrieval}")
+        retrieved_docs = retriever.retrieve(
+            query=request.query,
+            n_results=n_results_for_retrieval
+        )
+    return retrieved_docs
+
+
+def _chat_history(request: QueryRequest) -> List[dict]:
+    """Convert chat history to dict format."""
+    chat_history = []
+    if request.chat_history:
+        for msg in request.chat_history:
+            chat_history.append({
+                "role": msg.role,
+                "content": msg.content
+            })
+    return chat_history
+
+
+def _build_sources(db: Session, result: dict, retrieved_docs: List[dict]) -> List[SourceInfo]:
+    """Source infos of an answer, with chunk texts fetched from the database."""
+    # Create a mapping from chunk_id to text from retrieved_docs (fallback)
+    chunk_text_map = {}
+    for doc in retrieved_docs:
+        chunk_id = doc.get("id", "")
+        chunk_text = doc.get("text", "")
+        if chunk_id:
+            chunk_text_map[chunk_id] = chunk_text
+    
+    # Format sources with text content
+    # CRITICAL: Always fetch text directly from database to ensure we get the correct chunk
+    # The chunk_id is the source of truth, not the text from retrieved_docs which may be reordered
+    from database.crud import get_chunk_by_id
+    
+    sources = []
+    for source in result.get("sources", []):
+        chunk_id = source.get("chunk_id", "")
+        
+        # Always fetch chunk text from database using chunk_id to ensure correctness
+        chunk_text = ""
+        source_num = source.get("source_number", "?")
+        try:
+            db_chunk = get_chunk_by_id(db, chunk_id)
+            if db_chunk:
+                chunk_text = db_chunk.text
+                text_preview = chunk_text[:150].replace('\n', ' ')
+                logger.info(f"Source {source_num}: Fetched chunk from DB - chunk_id: {chunk_id[:8]}..., page: {db_chunk.page_number}, chunk_index: {db_chunk.chunk_index}, length: {len(chunk_text)}, preview: {text_preview}...")
+            else:
+                logger.warning(f"Source {source_num}: Chunk not found in database: {chunk_id}")
+                # Fallback to text from source or chunk_text_map
+                chunk_text = source.get("text", "") or chunk_text_map.get(chunk_id, "")
+        except Exception as e:
+            logger.error(f"Source {source_num}: Failed to fetch chunk from database: {e}", exc_info=True)
+            # Fallback to text from source or chunk_text_map
+            chunk_text = source.get("text", "") or chunk_text_map.get(chunk_id, "")
+        
+        # Don't truncate text - show full chunk content for better table/spec visibility
+        # The frontend can handle scrolling for long content
+        
+        sources.append(SourceInfo(
+            chunk_id=chunk_id,
+            document_id=source.get("document_id"),
+            page_number=source.get("page_number"),
+            similarity=None,  # Remove similarity display
+            text=chunk_text,
+            source_number=source.get("source_number")  # Preserve original source number
+        ))
+    return sources
+
+
 @router.post("", response_model=QueryResponse)
 def query_rag(
     request: QueryRequest,
@@ -81,59 +205,7 @@ def query_rag(
         # Retrieve relevant documents
         retrieval_start = time.time()
         
-        # For specification queries, try without reranking first to see if it helps
-        # The reranker might be prioritizing title chunks over technical specification chunks
-        spec_keywords = ["spezifikation", "specification", "specs", "technische", "hardware", 
-                        "wieviel", "wie viel", "welche", "was ist"]
-        
-        # Detect processor/CPU questions specifically - these often need multiple chunks
-        # because processor tables can span multiple chunks
-        query_lower = request.query.lower()
-        is_processor_query = any(term in query_lower for term in [
-            "prozessor", "prozessoren", "processor", "processors", "cpu", "cpus",
-            "welche prozessor", "welche processor", "prozessor-konfiguration",
-            "prozessoroptionen", "prozessor-optionen"
-        ])
-        
-        # Detect screen-to-body ratio questions - these may need more chunks to find the ratio information
-        is_screen_to_body_query = any(term in query_lower for term in [
-            "screen-to-body", "screen to body", "screen-to-body ratio", "screen to body ratio",
-            "bezel", "display bezel", "screen bezel"
-        ])
-        
-        # Processor queries and screen-to-body queries are also spec queries
-        is_spec_query = any(keyword in query_lower for keyword in spec_keywords) or is_processor_query or is_screen_to_body_query
-        
-        logger.info(f"Query classification: is_spec_query={is_spec_query}, is_processor_query={is_processor_query}, is_screen_to_body_query={is_screen_to_body_query}, use_reranking={request.use_reranking}")
-        
-        if request.use_reranking and not is_spec_query:
-            # Use reranking for non-spec queries
-            # Use user_id=1 as default since vector store is global
-            # For processor queries or screen-to-body queries, pass higher n_results to get more chunks
-            n_results_for_retrieval = 50 if (is_processor_query or is_screen_to_body_query) else None
-            retrieved_docs = retriever.retrieve_with_reranking(
-                user_id=1,
-                query=request.query,
-                reranker=get_reranker(),
-                n_results=n_results_for_retrieval
-            )
-        else:
-            # For spec queries (including processor queries and screen-to-body queries), use direct retrieval without reranking
-            # This helps find technical chunks that might be ranked lower by the reranker
-            # Get even more results for general spec queries to ensure Display, Battery, Dimensions are found
-            # For processor queries, get even more chunks (80-100) because tables can span multiple chunks
-            # For screen-to-body queries, also get more chunks (50-80) to find ratio information
-            if is_processor_query:
-                n_results_for_retrieval = 100
-            elif is_screen_to_body_query:
-                n_results_for_retrieval = 80
-            else:
-                n_results_for_retrieval = 50
-            logger.info(f"Using direct retrieval (no reranking) with n_results={n_results_for_retrieval}")
-            retrieved_docs = retriever.retrieve(
-                query=request.query,
-                n_results=n_results_for_retrieval
-            )
+        retrieved_docs = _retrieve_docs(request)
         
         logger.info(f"Retrieved {len(retrieved_docs)} documents for query")
         
@@ -148,14 +220,7 @@ def query_rag(
         # Generate answer
         generation_start = time.time()
         try:
-            # Convert chat history to dict format
-            chat_history = []
-            if request.chat_history:
-                for msg in request.chat_history:
-                    chat_history.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
+            chat_history = _chat_history(request)
             
             logger.info(f"Generating answer for query with {len(retrieved_docs)} retrieved documents and {len(chat_history)} previous messages")
             result = qa_chain.answer_with_retrieved_docs(
@@ -176,52 +241,7 @@ def query_rag(
                 "sources": []
             }
         
-        # Create a mapping from chunk_id to text from retrieved_docs (fallback)
-        chunk_text_map = {}
-        for doc in retrieved_docs:
-            chunk_id = doc.get("id", "")
-            chunk_text = doc.get("text", "")
-            if chunk_id:
-                chunk_text_map[chunk_id] = chunk_text
-        
-        # Format sources with text content
-        # CRITICAL: Always fetch text directly from database to ensure we get the correct chunk
-        # The chunk_id is the source of truth, not the text from retrieved_docs which may be reordered
-        from database.crud import get_chunk_by_id
-        
-        sources = []
-        for source in result.get("sources", []):
-            chunk_id = source.get("chunk_id", "")
-            
-            # Always fetch chunk text from database using chunk_id to ensure correctness
-            chunk_text = ""
-            source_num = source.get("source_number", "?")
-            try:
-                db_chunk = get_chunk_by_id(db, chunk_id)
-                if db_chunk:
-                    chunk_text = db_chunk.text
-                    text_preview = chunk_text[:150].replace('\n', ' ')
-                    logger.info(f"Source {source_num}: Fetched chunk from DB - chunk_id: {chunk_id[:8]}..., page: {db_chunk.page_number}, chunk_index: {db_chunk.chunk_index}, length: {len(chunk_text)}, preview: {text_preview}...")
-                else:
-                    logger.warning(f"Source {source_num}: Chunk not found in database: {chunk_id}")
-                    # Fallback to text from source or chunk_text_map
-                    chunk_text = source.get("text", "") or chunk_text_map.get(chunk_id, "")
-            except Exception as e:
-                logger.error(f"Source {source_num}: Failed to fetch chunk from database: {e}", exc_info=True)
-                # Fallback to text from source or chunk_text_map
-                chunk_text = source.get("text", "") or chunk_text_map.get(chunk_id, "")
-            
-            # Don't truncate text - show full chunk content for better table/spec visibility
-            # The frontend can handle scrolling for long content
-            
-            sources.append(SourceInfo(
-                chunk_id=chunk_id,
-                document_id=source.get("document_id"),
-                page_number=source.get("page_number"),
-                similarity=None,  # Remove similarity display
-                text=chunk_text,
-                source_number=source.get("source_number")  # Preserve original source number
-            ))
+        sources = _build_sources(db, result, retrieved_docs)
         
         # Save to query history
         source_ids = [s.chunk_id for s in sources]
@@ -258,6 +278,98 @@ def query_rag(
         )
 
 
+def _sse(data: dict) -> str:
+    """One server-sent event carrying a JSON payload."""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+def query_rag_stream(request: QueryRequest):
+    """
+    Execute a RAG query and stream the answer as server-sent events.
+    Emits {"delta": text} events while the answer is generated, then one final
+    {"sources": [...], "retrieval_time": ..., "generation_time": ..., "error": ...} event;
+    "error" is true if the answer is an error message rather than a generated answer.
+    """
+    start_time = time.time()
+
+    try:
+        retrieval_start = time.time()
+        retrieved_docs = _retrieve_docs(request)
+        logger.info(f"Retrieved {len(retrieved_docs)} documents for streamed query")
+        retrieval_time = time.time() - retrieval_start
+    except Exception as e:
+        logger.error(f"Error processing query: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing query: {str(e)}"
+        )
+
+    if not retrieved_docs:
+        raise HTTPException(
+            status_code=404,
+            detail="No relevant documents found. Please upload and index documents first."
+        )
+
+    chat_history = _chat_history(request)
+
+    def events():
+        generation_start = time.time()
+        result = {"answer": "", "sources": [], "error": True}
+        streamed_any = False
+        try:
+            for kind, payload in qa_chain.stream_answer_with_retrieved_docs(
+                question=request.query,
+                retrieved_docs=retrieved_docs,
+                chat_history=chat_history
+            ):
+                if kind == "delta":
+                    streamed_any = True
+                    yield _sse({"delta": payload})
+                else:
+                    result = payload
+        except Exception as e:
+            # Same answer as /api/query gives for a failed generation; the stream still ends with the final event
+            logger.error(f"Error in QA chain: {e}", exc_info=True)
+            answer = f"Fehler bei der Generierung der Antwort: {str(e)}"
+            yield _sse({"delta": ("\n\n" if streamed_any else "") + answer})
+            result = {"answer": answer, "sources": [], "error": True}
+        generation_time = time.time() - generation_start
+
+        # The response outlives the request's dependencies, so the stream uses its own session
+        db = SessionLocal()
+        try:
+            sources = _build_sources(db, result, retrieved_docs)
+            create_query_history(
+                db=db,
+                query=request.query,
+                answer=result["answer"],
+                sources=[s.chunk_id for s in sources],
+                metadata={
+                    "retrieval_time": retrieval_time,
+                    "generation_time": generation_time,
+                    "total_time": time.time() - start_time,
+                    "num_sources": len(sources)
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error finishing streamed query: {e}", exc_info=True)
+            sources = []
+            result["error"] = True
+        finally:
+            db.close()
+
+        logger.info(f"Streamed query processed: {request.query[:50]}...")
+        yield _sse({
+            "sources": [s.model_dump() for s in sources],
+            "retrieval_time": retrieval_time,
+            "generation_time": generation_time,
+            "error": result.get("error", False)
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @router.get("/history", response_model=List[QueryHistoryItem])
 def get_query_history_endpoint(
     limit: int = 50,
@@ -45,7 +45,8 @@ def root():
     return {"message": "RAG Pipeline API", "version": "1.0.0"}
 
 
-@app.get("/health")
+# HEAD lets clients probe the backend without a response body
+@app.api_route("/health", methods=["GET", "HEAD"])
 def health():
     """Health check endpoint."""
     return {"status": "healthy"}
@@ -12,6 +12,7 @@ from src.ingestion.pdf_processor_advanced import PDFProcessorAdvanced
 from src.chunking.chunker import Chunker
 from src.embeddings.embedder import Embedder
 from src.index.vector_store import VectorStore
+from src.retrieval.scoring import keyword_flag_metadata
 from database.database import SessionLocal, init_db
 from database.crud import create_document, create_chunk, get_user_by_id
 from logging_config.logger import get_logger
@@ -83,7 +84,10 @@ def ingest_file(file_path: str, user_id: int, db):
             metadatas.append({
                 "document_id": document.id,
                 "page_number": chunk["page_number"],
-                "chunk_index": chunk["chunk_index"]
+                "chunk_index": chunk["chunk_index"],
+                # Source filename lets retrieval match model/generation hints without a DB lookup
+                "source": document.filename,
+                **keyword_flag_metadata(chunk["text"])
             })
             ids.append(chunk["id"])
         
@@ -8,7 +8,7 @@ except ImportError:
         from langchain.text_splitters import RecursiveCharacterTextSplitter
 from typing import List, Dict, Optional
 import uuid
-import yaml
+from src.config_loader import load_config
 import os
 from logging_config.logger import get_logger
 
@@ -23,13 +23,8 @@ class Chunker:
         if config_path is None:
             config_path = os.getenv("CONFIG_PATH", "./config/settings.yaml")
         
-        # Load config
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                chunking_config = config.get("chunking", {})
-        else:
-            chunking_config = {}
+        # Load config (parsed once per process)
+        chunking_config = load_config(config_path).get("chunking", {})
         
         self.chunk_size = chunking_config.get("chunk_size", 1000)
         self.chunk_overlap = chunking_config.get("chunk_overlap", 200)
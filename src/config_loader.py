@@ -0,0 +1,16 @@
+"""Settings file loading shared by the pipeline components."""
+from functools import lru_cache
+import os
+import yaml
+
+# Prefer the libyaml-backed loader when PyYAML was built with it
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@lru_cache(maxsize=4)
+def load_config(config_path: str) -> dict:
+    """Parse a YAML settings file once per process; returns {} if it does not exist."""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, 'r') as f:
+        return yaml.load(f, Loader=_YamlLoader) or {}
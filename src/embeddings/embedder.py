@@ -1,7 +1,11 @@
 """HuggingFace embeddings for document chunks."""
 from sentence_transformers import SentenceTransformer
-from typing import List
+from concurrent.futures import Future
+from typing import List, Tuple
 import os
+import queue
+import threading
+import time
 from logging_config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -35,3 +39,59 @@ class Embedder:
         return self.model.get_sentence_embedding_dimension()
 
 
+
+
+class EmbeddingBatcher:
+    """
+    Collects embed requests from concurrent threads into one encode call.
+    The worker waits up to max_wait_ms after the first request for more to arrive.
+    """
+    
+    def __init__(self, embedder: Embedder, max_wait_ms: float = 5.0, max_batch_size: int = 32):
+        self.embedder = embedder
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.embedder.embed_texts(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            if len(batch) > 1:
+                logger.debug(f"Embedded batch of {len(batch)} queries")
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+    
+    def embed_text(self, text: str) -> List[float]:
+        """Embed a single text, batched with concurrent callers."""
+        if self.max_wait <= 0:
+            return self.embedder.embed_text(text)
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
@@ -1,13 +1,183 @@
 """ChromaDB vector store integration."""
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, NamedTuple, Tuple
+import numpy as np
 import os
 from pathlib import Path
+from src.config_loader import load_config
 from logging_config.logger import get_logger
 
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
 logger = get_logger(__name__)
 
+# Collections up to this size are queried by brute force from an in-memory copy (0 = off, the default).
+# The copy holds all embeddings, documents and metadata a second time in every worker process,
+# costs one collection count per query, and is reloaded in full after every ingest or delete.
+IN_MEMORY_MAX_VECTORS = int(os.getenv("VECTOR_STORE_IN_MEMORY_MAX", "0"))
+
+# Chroma collection metadata keys for the HNSW parameters in settings.yaml (vector_store.hnsw)
+HNSW_METADATA_KEYS = {
+    "M": "hnsw:M",
+    "construction_ef": "hnsw:construction_ef",
+    "search_ef": "hnsw:search_ef",
+}
+
+# Bumped on every write so caches of query results can detect stale entries
+_index_version = 0
+
+
+def get_index_version() -> int:
+    """Return the current index version."""
+    return _index_version
+
+
+def _bump_index_version():
+    global _index_version
+    _index_version += 1
+
+
+class QueryColumns(NamedTuple):
+    """Column view (one array per field) of one query of a result set."""
+    ids: np.ndarray
+    distances: np.ndarray
+    documents: np.ndarray
+    metadatas: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _object_column(values: List) -> np.ndarray:
+    """Build a 1-D object array without numpy trying to nest the values."""
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _equality_conditions(where: Optional[Dict]) -> Optional[Tuple[Tuple[str, object], ...]]:
+    """Flatten a where filter made only of equality conditions; None if it uses other operators."""
+    if not where:
+        return ()
+    conditions = []
+    for key, value in where.items():
+        if key == "$and":
+            for clause in value:
+                clause_conditions = _equality_conditions(clause)
+                if clause_conditions is None:
+                    return None
+                conditions.extend(clause_conditions)
+        elif key.startswith("$"):
+            return None
+        elif isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                return None
+            conditions.append((key, value["$eq"]))
+        else:
+            conditions.append((key, value))
+    return tuple(conditions)
+
+
+def _result_columns(results: Dict, index: int) -> QueryColumns:
+    """Column view of one query of a Chroma result set."""
+    ids = results["ids"][index] if results.get("ids") else []
+    n = len(ids)
+    if results.get("distances"):
+        distances = np.asarray(results["distances"][index], dtype=np.float32)
+    else:
+        distances = np.full(n, np.nan, dtype=np.float32)
+    documents = results["documents"][index] if results.get("documents") else [""] * n
+    metadatas = results["metadatas"][index] if results.get("metadatas") else [{}] * n
+    return QueryColumns(
+        ids=_object_column(ids),
+        distances=distances,
+        documents=_object_column(documents),
+        metadatas=_object_column([metadata or {} for metadata in metadatas])
+    )
+
+
+def union_columns(first: QueryColumns, second: QueryColumns) -> QueryColumns:
+    """Merge two result sets, dropping duplicate ids and ordering by distance."""
+    ids = np.concatenate([first.ids, second.ids])
+    distances = np.concatenate([first.distances, second.distances])
+    _, unique = np.unique(ids.astype(str), return_index=True)
+    unique = unique[np.argsort(distances[unique], kind="stable")]
+    return QueryColumns(
+        ids=ids[unique],
+        distances=distances[unique],
+        documents=np.concatenate([first.documents, second.documents])[unique],
+        metadatas=np.concatenate([first.metadatas, second.metadatas])[unique]
+    )
+
+
+class InMemoryBackend:
+    """Contiguous in-memory copy of a collection for exact brute-force top-k queries."""
+    
+    def __init__(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict], space: str, version: int):
+        self.ids = _object_column(ids)
+        self.matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        self.documents = _object_column(documents)
+        self.metadatas = _object_column([metadata or {} for metadata in metadatas])
+        self.space = space
+        self.version = version
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self._filter_masks: Dict[Tuple, np.ndarray] = {}
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def distances(self, query: np.ndarray) -> np.ndarray:
+        """Distances from the query to every vector, in the collection's distance space."""
+        if simsimd is not None and self.space in ("l2", "cosine"):
+            metric = "sqeuclidean" if self.space == "l2" else "cosine"
+            return np.asarray(simsimd.cdist(query[None, :], self.matrix, metric=metric), dtype=np.float32).reshape(-1)
+        dots = self.matrix @ query
+        if self.space == "cosine":
+            norms = np.sqrt(self.sq_norms) * np.linalg.norm(query)
+            return 1.0 - dots / np.maximum(norms, np.finfo(np.float32).tiny)
+        if self.space == "ip":
+            return 1.0 - dots
+        # Chroma's l2 space reports squared euclidean distances
+        return np.maximum(self.sq_norms - 2.0 * dots + np.dot(query, query), 0.0)
+    
+    def _filter_mask(self, conditions: Tuple[Tuple[str, object], ...]) -> np.ndarray:
+        """Boolean mask of the vectors whose metadata satisfies all equality conditions."""
+        mask = self._filter_masks.get(conditions)
+        if mask is None:
+            mask = np.fromiter(
+                (all(metadata.get(key) == value for key, value in conditions) for metadata in self.metadatas),
+                dtype=bool,
+                count=len(self.metadatas)
+            )
+            self._filter_masks[conditions] = mask
+        return mask
+    
+    def query(self, query_embedding, n_results: int, conditions: Tuple[Tuple[str, object], ...] = ()) -> QueryColumns:
+        """Return the n_results nearest vectors matching the conditions, closest first."""
+        distances = self.distances(np.asarray(query_embedding, dtype=np.float32))
+        if conditions:
+            mask = self._filter_mask(conditions)
+            distances = np.where(mask, distances, np.inf).astype(np.float32)
+            n_results = min(n_results, int(mask.sum()))
+        k = min(n_results, len(distances))
+        if k <= 0:
+            return QueryColumns(
+                ids=self.ids[:0], distances=distances[:0],
+                documents=self.documents[:0], metadatas=self.metadatas[:0]
+            )
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(k)
+        top = top[np.argsort(distances[top], kind="stable")]
+        return QueryColumns(
+            ids=self.ids[top],
+            distances=distances[top].astype(np.float32),
+            documents=self.documents[top],
+            metadatas=self.metadatas[top]
+        )
+
 
 class VectorStore:
     """ChromaDB vector store wrapper."""
@@ -24,6 +194,20 @@ class VectorStore:
         
         self.db_path = db_path
         self.collection_name = collection_name
+        self._in_memory: Optional[InMemoryBackend] = None
+        # Collection handle, looked up once instead of on every query
+        self._collection = None
+        # covers_all results, keyed by filter and valid for one index version
+        self._coverage: Dict[str, bool] = {}
+        self._coverage_version = None
+        
+        # HNSW parameters for newly created collections
+        hnsw_config = load_config(os.getenv("CONFIG_PATH", "./config/settings.yaml")).get("vector_store", {}).get("hnsw", {})
+        self.hnsw_metadata = {
+            metadata_key: hnsw_config[key]
+            for key, metadata_key in HNSW_METADATA_KEYS.items()
+            if hnsw_config.get(key) is not None
+        }
         
         # Initialize ChromaDB client
         self.client = chromadb.PersistentClient(
@@ -35,9 +219,17 @@ class VectorStore:
     
     def get_collection(self):
         """Get or create the global collection."""
-        collection = self.client.get_or_create_collection(
-            name=self.collection_name
-        )
+        if self._collection is not None:
+            return self._collection
+        try:
+            collection = self.client.get_collection(name=self.collection_name)
+        except Exception:
+            # Not created yet - HNSW parameters can only be set at creation time
+            collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=self.hnsw_metadata or None
+            )
+        self._collection = collection
         return collection
     
     def add_documents(
@@ -55,6 +247,7 @@ class VectorStore:
             metadatas=metadatas,
             ids=ids
         )
+        _bump_index_version()
         logger.info(f"Added {len(texts)} documents to collection")
     
     def query(
@@ -85,16 +278,134 @@ class VectorStore:
         logger.debug(f"Query returned results", num_results=num_results, n_results_requested=n_results)
         return results
     
+    def covers_all(self, where: Dict) -> bool:
+        """
+        Whether every vector in the collection matches a metadata filter.
+        Checked once per index version (process-local, like the version itself).
+        """
+        if self._coverage_version != _index_version:
+            self._coverage = {}
+            self._coverage_version = _index_version
+        key = repr(sorted(where.items()))
+        covered = self._coverage.get(key)
+        if covered is None:
+            collection = self.get_collection()
+            count = collection.count()
+            matching = len(collection.get(where=where, include=[])["ids"]) if count else 0
+            covered = matching == count
+            self._coverage[key] = covered
+        return covered
+    
+    def prefer_in_memory(self, where: Optional[Dict] = None) -> bool:
+        """Whether a query can be served from the in-memory backend (no filter or equality filters only)."""
+        return IN_MEMORY_MAX_VECTORS > 0 and _equality_conditions(where) is not None
+    
+    def _in_memory_backend(self) -> Optional[InMemoryBackend]:
+        """Return an up-to-date in-memory copy of the collection, or None if it is too large."""
+        collection = self.get_collection()
+        count = collection.count()
+        backend = self._in_memory
+        # Reload after writes from this process (index version) or from others (count)
+        if backend is not None and backend.version == _index_version and len(backend) == count:
+            return backend
+        
+        self._in_memory = None
+        if count == 0 or count > IN_MEMORY_MAX_VECTORS:
+            return None
+        
+        version = _index_version
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(embeddings) != len(data["ids"]):
+            return None
+        
+        self._in_memory = InMemoryBackend(
+            ids=data["ids"],
+            embeddings=embeddings,
+            documents=data.get("documents") or [""] * len(data["ids"]),
+            metadatas=data.get("metadatas") or [{}] * len(data["ids"]),
+            space=space,
+            version=version
+        )
+        logger.info(f"Loaded {count} vectors into in-memory backend (space: {space})")
+        return self._in_memory
+    
+    def query_columns(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> QueryColumns:
+        """
+        Query the vector store and return the first query's results as columns.
+        Distances are float32 (NaN where missing), the other columns are object arrays.
+        Small collections are served by brute force from memory instead of Chroma
+        when the filter only uses equality conditions.
+        """
+        if len(query_embeddings) == 1 and self.prefer_in_memory(where):
+            try:
+                backend = self._in_memory_backend()
+                if backend is not None:
+                    return backend.query(query_embeddings[0], n_results, _equality_conditions(where))
+            except Exception as e:
+                logger.warning(f"In-memory query failed, falling back to ChromaDB: {e}")
+                self._in_memory = None
+        
+        # Query the collection directly - query() adds a count() round trip for debug logging
+        results = self.get_collection().query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        columns = _result_columns(results, 0)
+        if len(columns) == 0:
+            logger.warning(f"Query returned no results", n_results_requested=n_results)
+        return columns
+    
+    def query_columns_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> List[QueryColumns]:
+        """Query several embeddings at once and return one column view per query embedding."""
+        if not query_embeddings:
+            return []
+        if self.prefer_in_memory(where):
+            try:
+                backend = self._in_memory_backend()
+                if backend is not None:
+                    conditions = _equality_conditions(where)
+                    return [backend.query(embedding, n_results, conditions) for embedding in query_embeddings]
+            except Exception as e:
+                logger.warning(f"In-memory query failed, falling back to ChromaDB: {e}")
+                self._in_memory = None
+        
+        # One Chroma call for all query embeddings
+        results = self.get_collection().query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [_result_columns(results, index) for index in range(len(query_embeddings))]
+    
     def delete_documents(self, ids: List[str]):
         """Delete documents from the vector store."""
         collection = self.get_collection()
         collection.delete(ids=ids)
+        _bump_index_version()
         logger.info(f"Deleted {len(ids)} documents from collection")
     
     def delete_collection(self):
         """Delete the collection."""
         try:
             self.client.delete_collection(name=self.collection_name)
+            _bump_index_version()
+            self._in_memory = None
+            self._collection = None
             logger.info(f"Deleted collection")
         except Exception as e:
             logger.warning(f"Failed to delete collection: {e}")
@@ -4,9 +4,15 @@ try:
     from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 except ImportError:
     from langchain.schema import HumanMessage, SystemMessage, AIMessage
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 import os
-import yaml
+from src.config_loader import load_config
+from src.retrieval.query_features import find_models_and_gens
+from src.qa.chunk_keywords import (
+    chunk_keyword_hits, processor_signals, has_component_specs, has_display_or_graphics_specs,
+    is_important_spec_chunk, is_general_spec_chunk, is_screen_to_body_chunk,
+    PIPE, PROCESSOR_LITERAL, PROCESSOR_LOG_TERM
+)
 import re
 from dotenv import load_dotenv
 from logging_config.logger import get_logger
@@ -18,6 +24,10 @@ load_dotenv()
 
 logger = get_logger(__name__)
 
+# Source references in answers: "Quelle X" / "[Quelle X]" and ranges "Quelle X-Y"
+SOURCE_REF_RE = re.compile(r'(?:\[)?Quelle\s+(\d+)(?:\])?', re.IGNORECASE)
+SOURCE_RANGE_RE = re.compile(r'Quelle\s+(\d+)\s*-\s*(\d+)', re.IGNORECASE)
+
 
 class QAChain:
     """Question-answering chain with context."""
@@ -27,13 +37,8 @@ class QAChain:
         if config_path is None:
             config_path = os.getenv("CONFIG_PATH", "./config/settings.yaml")
         
-        # Load config
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                qa_config = config.get("qa", {})
-        else:
-            qa_config = {}
+        # Load config (parsed once per process)
+        qa_config = load_config(config_path).get("qa", {})
         
         model_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # Use gpt-4o-mini as default (faster, cheaper)
         temperature = qa_config.get("temperature", 0.7)
@@ -75,55 +80,9 @@ class QAChain:
             other_chunks = []
             
             for doc in retrieved_docs:
-                text_lower = doc.get("text", "").lower()
-                is_important = False
-                
                 # Check if this is an important spec chunk (Processor, RAM, Storage, Battery, Weight, Dimensions, Display)
-                # Processor chunks with model names - also check for GPU tables that contain processor info
-                # Check for processor keywords OR GPU/graphics tables that might contain processor specifications
-                has_processor_keywords = (("processor" in text_lower or "cpu" in text_lower or "prozessor" in text_lower) and 
-                    (any(brand in text_lower for brand in ["intel", "amd", "core", "ryzen", "ultra", "i3", "i5", "i7", "i9"]) or
-                     any(model in text_lower for model in ["ghz", "mhz", "cores", "kerne", "threads", "thread", "p-core", "e-core"])))
-                # Also check for GPU/graphics tables that contain processor names (common pattern)
-                has_gpu_table_with_processors = (("gpu" in text_lower or "graphics" in text_lower or "grafik" in text_lower) and 
-                    any(proc_name in text_lower for proc_name in ["u300e", "i3-1315u", "core 3 100u", "core 5 120u", "core 5 220u", "core 7 150u", "core 7 250u", "core ultra 5", "core ultra 7"]))
-                # Check for processor model numbers (e.g., 225H, 225U, 235H, 235U, 245H, 245U)
-                has_processor_models = any(model in text_lower for model in [
-                    "225h", "225u", "235h", "235u", "245h", "245u", "255h", "255u",
-                    "core ultra 5 225", "core ultra 5 235", "core ultra 5 245",
-                    "core ultra 7 155", "core ultra 7 165", "core ultra 7 155h", "core ultra 7 165h"
-                ])
-                # Check for table-like structures that might contain processor information
-                doc_text = doc.get("text", "")
-                has_table_structure = (("|" in doc_text or "---" in doc_text or "table" in text_lower) and 
-                    any(keyword in text_lower for keyword in ["processor", "cpu", "core", "ultra", "intel", "amd"]))
-                
-                if has_processor_keywords or has_gpu_table_with_processors or has_processor_models or has_table_structure:
-                    is_important = True
-                # RAM/Memory chunks
-                elif (("memory" in text_lower or "ram" in text_lower or "speicher" in text_lower or "arbeitsspeicher" in text_lower) and 
-                      any(unit in text_lower for unit in ["gb", "ddr4", "ddr5", "ddr3", "sodimm"])):
-                    is_important = True
-                # Storage chunks
-                elif (("storage" in text_lower or "ssd" in text_lower or "hdd" in text_lower) and 
-                      any(unit in text_lower for unit in ["gb", "tb", "m.2", "capacity"])):
-                    is_important = True
-                # Battery chunks
-                elif (("battery" in text_lower or "akku" in text_lower) and any(unit in text_lower for unit in ["w", "wh", "capacity"])):
-                    is_important = True
-                # Weight chunks
-                elif (("weight" in text_lower or "gewicht" in text_lower) and any(unit in text_lower for unit in ["kg", "lbs", "g"])):
-                    is_important = True
-                # Dimensions chunks
-                elif (("dimensions" in text_lower or "abmessungen" in text_lower) and any(unit in text_lower for unit in ["mm", "inches", "cm"])):
-                    is_important = True
-                # Display chunks
-                elif (("display" in text_lower or "screen" in text_lower) and any(unit in text_lower for unit in ["nits", "inch", "resolution", "fhd", "uhd", "4k"])):
-                    is_important = True
-                # Graphics/GPU chunks
-                elif (("graphics" in text_lower or "gpu" in text_lower or "grafik" in text_lower) and 
-                      any(brand in text_lower for brand in ["intel", "amd", "nvidia", "arc", "radeon"])):
-                    is_important = True
+                # All keyword groups are found in one scan of the chunk text
+                is_important = is_important_spec_chunk(chunk_keyword_hits(doc.get("text", "").lower()))
                 
                 if is_important:
                     important_spec_chunks.append(doc)
@@ -153,8 +112,7 @@ class QAChain:
                 logger.info(f"format_context: Target graphics table chunk found at position {i} in context")
             
             # Log processor-related chunks
-            text_lower = text.lower()
-            if any(term in text_lower for term in ["processor", "prozessor", "core ultra", "intel core"]):
+            if chunk_keyword_hits(text.lower()) & PROCESSOR_LOG_TERM:
                 logger.info(f"format_context: Processor chunk found at position {i} - chunk_id: {chunk_id[:8]}..., text_preview: {text[:100]}...")
             
             context_parts.append(
@@ -169,20 +127,18 @@ class QAChain:
         
         return formatted_context
     
-    def answer(
+    def _build_messages(
         self,
         question: str,
         context: str,
-        return_sources: bool = True,
         chat_history: Optional[List[Dict]] = None,
         concise_mode: bool = False,
         eval_mode: bool = False,
         ground_truth: Optional[str] = None
-    ) -> Dict:
-        """
-        Answer a question based on context and chat history.
-        Returns dict with answer and optionally sources.
-        """
+    ) -> Tuple[List, int]:
+        """Build the LLM messages for a question; returns (messages, max_tokens for the call)."""
+        max_tokens = self.default_max_tokens
+        
         # Build messages with chat history
         messages = [SystemMessage(content=self.system_prompt)]
         
@@ -234,16 +190,12 @@ class QAChain:
             brand = "IdeaPad"
         
         # Detect model names (E14, E16, L14, P15v, etc.) - pattern: letter(s) followed by numbers
-        model_pattern = r'\b([a-z]\d{1,2}|[a-z]{2}\d{1,2})\b'
-        model_matches = re.findall(model_pattern, question_lower)
+        model_matches, gen_matches = find_models_and_gens(question_lower)
         
         if model_matches:
             model = max(model_matches, key=len).upper()  # Use longest match and uppercase
             
-            # Detect generation number
-            gen_pattern = r'\b(?:gen|generation)\s*(\d+)\b'
-            gen_matches = re.findall(gen_pattern, question_lower)
-            
+            # Generation number (Gen X, Generation X, GenX)
             if gen_matches:
                 gen_num = gen_matches[0]
                 product_name = f"{brand} {model} Gen {gen_num}" if brand else f"{model} Gen {gen_num}"
@@ -504,38 +456,49 @@ WICHTIG FÜR EVALUIERUNG:
 - Wenn der Ground Truth eine Komma-getrennte Liste ist, verwende das gleiche Format
 """
             
-            # Temporär max_tokens für diese Anfrage anpassen
+            # max_tokens für diese Anfrage anpassen
             if self.eval_max_tokens:
-                original_max_tokens = self.llm.max_tokens
-                self.llm.max_tokens = min(self.eval_max_tokens, estimated_tokens + 50)  # Etwas Puffer
+                max_tokens = min(self.eval_max_tokens, estimated_tokens + 50)  # Etwas Puffer
         
         messages.append(HumanMessage(content=context_prompt))
         
         # For processor questions, increase max_tokens to allow listing all processors
-        original_max_tokens = self.llm.max_tokens
         is_processor_question = any(term in question.lower() for term in [
             "prozessor", "prozessoren", "processor", "processors", "cpu", "cpus",
             "welche prozessor", "welche processor"
         ])
         if is_processor_question:
             # Increase max_tokens for processor questions to allow listing all processors
-            self.llm.max_tokens = max(original_max_tokens, 3000)
-            logger.info(f"Increased max_tokens to {self.llm.max_tokens} for processor question")
+            max_tokens = max(max_tokens, 3000)
+            logger.info(f"Increased max_tokens to {max_tokens} for processor question")
+        
+        return messages, max_tokens
+    
+    def answer(
+        self,
+        question: str,
+        context: str,
+        return_sources: bool = True,
+        chat_history: Optional[List[Dict]] = None,
+        concise_mode: bool = False,
+        eval_mode: bool = False,
+        ground_truth: Optional[str] = None
+    ) -> Dict:
+        """
+        Answer a question based on context and chat history.
+        Returns dict with answer and optionally sources.
+        """
+        messages, max_tokens = self._build_messages(
+            question, context, chat_history, concise_mode, eval_mode, ground_truth
+        )
         
         # Get answer from LLM
         try:
-            logger.info(f"Calling LLM", num_messages=len(messages), context_length=len(context), eval_mode=eval_mode, max_tokens=self.llm.max_tokens)
+            logger.info(f"Calling LLM", num_messages=len(messages), context_length=len(context), eval_mode=eval_mode, max_tokens=max_tokens)
             logger.debug(f"LLM Prompt", messages=[m.content for m in messages])
             
-            response = self.llm.invoke(messages)
-            
-            # Restore original max_tokens
-            if is_processor_question:
-                self.llm.max_tokens = original_max_tokens
-            
-            # Stelle max_tokens wieder her wenn eval_mode verwendet wurde
-            if eval_mode and self.eval_max_tokens:
-                self.llm.max_tokens = self.default_max_tokens
+            # max_tokens is passed per call, so the shared LLM client is never modified
+            response = self.llm.invoke(messages, max_tokens=max_tokens)
             
             logger.debug(f"LLM Raw Response", response=response)
             
@@ -563,7 +526,17 @@ WICHTIG FÜR EVALUIERUNG:
             logger.error(f"Error generating answer: {e}", exc_info=True)
             answer = f"Fehler bei der Generierung der Antwort: {str(e)}"
         
-        # Log interaction
+        self._log_interaction(question, answer, context, chat_history)
+        
+        result = {
+            "answer": answer,
+            "question": question
+        }
+        
+        return result
+    
+    def _log_interaction(self, question: str, answer: str, context: str, chat_history: Optional[List[Dict]]):
+        """Write a question/answer pair to the interaction log."""
         try:
             interaction_data = {
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -577,25 +550,9 @@ WICHTIG FÜR EVALUIERUNG:
             loguru_logger.bind(type="interaction").info(json.dumps(interaction_data, ensure_ascii=False))
         except Exception as e:
             logger.error(f"Failed to log interaction: {e}")
-
-        
-        result = {
-            "answer": answer,
-            "question": question
-        }
-        
-        return result
     
-    def answer_with_retrieved_docs(
-        self,
-        question: str,
-        retrieved_docs: List[Dict],
-        chat_history: Optional[List[Dict]] = None,
-        concise_mode: bool = False,
-        eval_mode: bool = False,
-        ground_truth: Optional[str] = None
-    ) -> Dict:
-        """Answer question using retrieved documents and chat history."""
+    def _prepare_docs(self, question: str, retrieved_docs: List[Dict], eval_mode: bool = False) -> Tuple[List[Dict], str]:
+        """Order and limit the retrieved documents; returns (ordered docs, formatted context)."""
         # Detect if this is a general spec query (asking for all specs, not specific ones)
         question_lower = question.lower()
         is_general_spec = any(kw in question_lower for kw in ["spezifikation", "specification", "specs", "technische"]) and \
@@ -609,17 +566,8 @@ WICHTIG FÜR EVALUIERUNG:
             other_chunks = []
             
             for doc in retrieved_docs:
-                text_lower = doc.get("text", "").lower()
-                # Processor chunks with model names
-                is_important = (("processor" in text_lower or "cpu" in text_lower or "prozessor" in text_lower) and 
-                               (any(brand in text_lower for brand in ["intel", "amd", "core", "ryzen", "ultra", "i3", "i5", "i7", "i9"]) or
-                                any(model in text_lower for model in ["ghz", "mhz", "cores", "kerne", "threads", "thread", "p-core", "e-core"]))) or \
-                              (("battery" in text_lower or "akku" in text_lower) and any(unit in text_lower for unit in ["w", "wh", "capacity"])) or \
-                              (("weight" in text_lower or "gewicht" in text_lower) and any(unit in text_lower for unit in ["kg", "lbs", "g"])) or \
-                              (("dimensions" in text_lower or "abmessungen" in text_lower) and any(unit in text_lower for unit in ["mm", "inches", "cm"])) or \
-                              (("display" in text_lower or "screen" in text_lower) and any(unit in text_lower for unit in ["nits", "inch", "resolution"])) or \
-                              (("memory" in text_lower or "ram" in text_lower or "speicher" in text_lower) and any(unit in text_lower for unit in ["gb", "ddr4", "ddr5"])) or \
-                              (("storage" in text_lower or "ssd" in text_lower) and any(unit in text_lower for unit in ["gb", "tb", "m.2"]))
+                # Processor, battery, weight, dimension, display, memory or storage chunks
+                is_important = is_general_spec_chunk(chunk_keyword_hits(doc.get("text", "").lower()))
                 
                 if is_important:
                     important_chunks.append(doc)
@@ -645,35 +593,20 @@ WICHTIG FÜR EVALUIERUNG:
         other_chunks = []
         
         for doc in retrieved_docs:
-            text_lower = doc.get("text", "").lower()
-            doc_text = doc.get("text", "")
+            hits = chunk_keyword_hits(doc.get("text", "").lower())
             is_important = False
             is_processor_chunk = False
             
             # Same logic as in format_context
             # Enhanced processor detection: also check for processor model numbers and table structures
-            has_processor_keywords = (("processor" in text_lower or "cpu" in text_lower or "prozessor" in text_lower) and 
-                (any(brand in text_lower for brand in ["intel", "amd", "core", "ryzen", "ultra", "i3", "i5", "i7", "i9"]) or
-                 any(model in text_lower for model in ["ghz", "mhz", "cores", "kerne", "threads", "thread", "p-core", "e-core"])))
-            has_gpu_table_with_processors = (("gpu" in text_lower or "graphics" in text_lower or "grafik" in text_lower) and 
-                any(proc_name in text_lower for proc_name in ["u300e", "i3-1315u", "core 3 100u", "core 5 120u", "core 5 220u", "core 7 150u", "core 7 250u", "core ultra 5", "core ultra 7"]))
-            # Check for processor model numbers (e.g., 225H, 225U, 235H, 235U, 245H, 245U)
-            has_processor_models = any(model in text_lower for model in [
-                "225h", "225u", "235h", "235u", "245h", "245u", "255h", "255u",
-                "core ultra 5 225", "core ultra 5 235", "core ultra 5 245",
-                "core ultra 7 155", "core ultra 7 165", "core ultra 7 155h", "core ultra 7 165h",
-                "core ultra 5 125u", "core ultra 5 135u", "core ultra 5 125h",
-                "core ultra 7 155u", "core ultra 7 165u", "core ultra 7 155h"
-            ])
-            # Check for table-like structures that might contain processor information
-            has_table_structure = (("|" in doc_text or "---" in doc_text or "table" in text_lower) and 
-                any(keyword in text_lower for keyword in ["processor", "cpu", "core", "ultra", "intel", "amd"]))
+            has_processor_keywords, has_gpu_table_with_processors, has_processor_models, has_table_structure = \
+                processor_signals(hits, extended_models=True)
             
             # For processor questions, check if this is specifically a processor table chunk
             if is_processor_question_here:
                 # Check if this chunk contains processor table rows
                 has_processor_table = (
-                    ("|" in doc_text and "processor" in text_lower) or
+                    (bool(hits & PIPE) and bool(hits & PROCESSOR_LITERAL)) or
                     (has_table_structure and has_processor_models) or
                     (has_table_structure and has_processor_keywords)
                 )
@@ -684,34 +617,10 @@ WICHTIG FÜR EVALUIERUNG:
                 processor_chunks.append(doc)
             elif has_processor_keywords or has_gpu_table_with_processors or has_processor_models or has_table_structure:
                 is_important = True
-            elif (("memory" in text_lower or "ram" in text_lower or "speicher" in text_lower or "arbeitsspeicher" in text_lower) and 
-                  any(unit in text_lower for unit in ["gb", "ddr4", "ddr5", "ddr3", "sodimm"])):
-                is_important = True
-            elif (("storage" in text_lower or "ssd" in text_lower or "hdd" in text_lower) and 
-                  any(unit in text_lower for unit in ["gb", "tb", "m.2", "capacity"])):
-                is_important = True
-            elif (("battery" in text_lower or "akku" in text_lower) and any(unit in text_lower for unit in ["w", "wh", "capacity"])):
-                is_important = True
-            elif (("weight" in text_lower or "gewicht" in text_lower) and any(unit in text_lower for unit in ["kg", "lbs", "g"])):
-                is_important = True
-            elif (("dimensions" in text_lower or "abmessungen" in text_lower) and any(unit in text_lower for unit in ["mm", "inches", "cm"])):
-                is_important = True
-            # Screen-to-Body Ratio chunks - prioritize these highly
-            # Check for explicit mention first
-            if "screen-to-body" in text_lower or "screen to body" in text_lower:
-                is_important = True
-            elif (("bezel" in text_lower or "display bezel" in text_lower or "screen bezel" in text_lower) and
-                  (any(ratio_term in text_lower for ratio_term in ["ratio", "%"]) or
-                   any(pct in text_lower for pct in ["85%", "85.5%", "86%", "87%", "88%", "88.5%", "89%", "90%", "91%", "92%", "93%", "94%", "95%"]))):
-                is_important = True
-            elif (("display" in text_lower or "screen" in text_lower) and
-                  any(pct in text_lower for pct in ["85%", "85.5%", "86%", "87%", "88%", "88.5%", "89%", "90%", "91%", "92%", "93%", "94%", "95%"])):
-                # Display chunks with percentage - likely screen-to-body ratio
+            elif has_component_specs(hits):
                 is_important = True
-            elif (("display" in text_lower or "screen" in text_lower) and any(unit in text_lower for unit in ["nits", "inch", "resolution", "fhd", "uhd", "4k"])):
-                is_important = True
-            elif (("graphics" in text_lower or "gpu" in text_lower or "grafik" in text_lower) and 
-                  any(brand in text_lower for brand in ["intel", "amd", "nvidia", "arc", "radeon"])):
+            # Screen-to-Body Ratio chunks - prioritize these highly, then display and graphics chunks
+            if is_screen_to_body_chunk(hits) or has_display_or_graphics_specs(hits):
                 is_important = True
             
             if is_important:
@@ -833,29 +742,20 @@ WICHTIG FÜR EVALUIERUNG:
                     # Re-format context with reduced chunks
                     context = self.format_context(ordered_docs, preserve_order=True)
                     logger.info(f"Reformatted context with {len(ordered_docs)} chunks, estimated {len(context) / 3.5:.0f} tokens")
-        result = self.answer(
-            question, 
-            context, 
-            return_sources=True, 
-            chat_history=chat_history, 
-            concise_mode=concise_mode,
-            eval_mode=eval_mode,
-            ground_truth=ground_truth
-        )
-        
+        return ordered_docs, context
+    
+    def _select_sources(self, answer: str, ordered_docs: List[Dict]) -> List[Dict]:
+        """Sources for an answer: the documents referenced as "Quelle N", else the top documents by similarity."""
         # Extract source numbers from answer (e.g., "Quelle 6" -> 6)
-        answer = result.get("answer", "")
         source_numbers = set()
         
-        # Pattern to match "Quelle X" or "[Quelle X]"
-        single_pattern = r'(?:\[)?Quelle\s+(\d+)(?:\])?'
-        matches = re.findall(single_pattern, answer, re.IGNORECASE)
+        # Match "Quelle X" or "[Quelle X]"
+        matches = SOURCE_REF_RE.findall(answer)
         for match in matches:
             source_numbers.add(int(match))
         
-        # Pattern to match "Quelle X-Y" (range)
-        range_pattern = r'Quelle\s+(\d+)\s*-\s*(\d+)'
-        range_matches = re.findall(range_pattern, answer, re.IGNORECASE)
+        # Match "Quelle X-Y" (range)
+        range_matches = SOURCE_RANGE_RE.findall(answer)
         for start_str, end_str in range_matches:
             start, end = int(start_str), int(end_str)
             source_numbers.update(range(start, end + 1))
@@ -878,16 +778,16 @@ WICHTIG FÜR EVALUIERUNG:
                         "source_number": i  # Preserve original source number from context
                     })
             
-            result["sources"] = filtered_sources
             logger.info(f"Filtered sources: found {len(source_numbers)} referenced sources ({source_numbers}) out of {len(ordered_docs)} total")
             logger.info(f"Returned chunk_ids: {[s['chunk_id'][:8] + '...' for s in filtered_sources]}")
+            return filtered_sources
         else:
             # No source references found - return top sources by similarity (max 10)
             # Sort by similarity (descending) and take top 10
             sorted_docs = sorted(ordered_docs, key=lambda x: x.get("similarity", 0.0), reverse=True)
             top_sources = sorted_docs[:10]
             
-            result["sources"] = [{
+            sources = [{
                 "chunk_id": doc.get("id"),
                 "document_id": doc.get("metadata", {}).get("document_id"),
                 "page_number": doc.get("metadata", {}).get("page_number"),
@@ -896,10 +796,80 @@ WICHTIG FÜR EVALUIERUNG:
             } for doc in top_sources]
             
             logger.info(f"No source references found in answer, returning top {len(top_sources)} sources by similarity")
+            return sources
+    
+    def answer_with_retrieved_docs(
+        self,
+        question: str,
+        retrieved_docs: List[Dict],
+        chat_history: Optional[List[Dict]] = None,
+        concise_mode: bool = False,
+        eval_mode: bool = False,
+        ground_truth: Optional[str] = None
+    ) -> Dict:
+        """Answer question using retrieved documents and chat history."""
+        ordered_docs, context = self._prepare_docs(question, retrieved_docs, eval_mode)
+        
+        result = self.answer(
+            question, 
+            context, 
+            return_sources=True, 
+            chat_history=chat_history, 
+            concise_mode=concise_mode,
+            eval_mode=eval_mode,
+            ground_truth=ground_truth
+        )
+        
+        result["sources"] = self._select_sources(result.get("answer", ""), ordered_docs)
         
         # Return the actual chunks used for answer generation (for RAGAS evaluation)
         # This ensures RAGAS evaluates with the same chunks that were used to generate the answer
         result["used_chunks"] = ordered_docs
         
         return result
+    
+    def stream_answer_with_retrieved_docs(
+        self,
+        question: str,
+        retrieved_docs: List[Dict],
+        chat_history: Optional[List[Dict]] = None
+    ) -> Iterator[Tuple[str, object]]:
+        """
+        Like answer_with_retrieved_docs, but streams the answer.
+        Yields ("delta", text) for each generated piece, then ("result", result dict).
+        The result's "error" is True if no answer could be generated.
+        """
+        ordered_docs, context = self._prepare_docs(question, retrieved_docs)
+        messages, max_tokens = self._build_messages(question, context, chat_history)
+        
+        parts = []
+        error = False
+        try:
+            logger.info(f"Streaming LLM answer", num_messages=len(messages), context_length=len(context), max_tokens=max_tokens)
+            for chunk in self.llm.stream(messages, max_tokens=max_tokens):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield "delta", chunk.content
+            answer = "".join(parts)
+            if not answer.strip():
+                logger.warning("LLM returned empty streamed answer")
+                error = True
+                answer = "Entschuldigung, ich konnte keine Antwort generieren. Bitte versuchen Sie es mit einer anderen Formulierung."
+                yield "delta", answer
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}", exc_info=True)
+            error = True
+            answer = f"Fehler bei der Generierung der Antwort: {str(e)}"
+            yield "delta", ("\n\n" if parts else "") + answer
+        
+        self._log_interaction(question, answer, context, chat_history)
+        
+        yield "result", {
+            "answer": answer,
+            "question": question,
+            "sources": self._select_sources(answer, ordered_docs),
+            "used_chunks": ordered_docs,
+            "error": error
+        }
+
 
@@ -0,0 +1,157 @@
+"""Keyword classification of retrieved chunks for context ordering in the QA chain."""
+from src.retrieval.keywords import KeywordMatcher
+
+# Keyword groups found in a chunk, as bits of one hit mask
+PROCESSOR_WORD = 1 << 0
+PROCESSOR_DETAIL = 1 << 1
+GRAPHICS_WORD = 1 << 2
+PROCESSOR_NAME = 1 << 3
+PROCESSOR_MODEL = 1 << 4
+PROCESSOR_MODEL_EXTRA = 1 << 5
+TABLE_MARKER = 1 << 6
+PIPE = 1 << 7
+PROCESSOR_TABLE_WORD = 1 << 8
+PROCESSOR_LITERAL = 1 << 9
+MEMORY_WORD = 1 << 10
+MEMORY_UNIT = 1 << 11
+MEMORY_UNIT_EXTRA = 1 << 12
+STORAGE_WORD = 1 << 13
+STORAGE_WORD_EXTRA = 1 << 14
+STORAGE_UNIT = 1 << 15
+STORAGE_UNIT_EXTRA = 1 << 16
+BATTERY_WORD = 1 << 17
+BATTERY_UNIT = 1 << 18
+WEIGHT_WORD = 1 << 19
+WEIGHT_UNIT = 1 << 20
+DIMENSIONS_WORD = 1 << 21
+DIMENSIONS_UNIT = 1 << 22
+DISPLAY_WORD = 1 << 23
+DISPLAY_UNIT = 1 << 24
+DISPLAY_UNIT_EXTRA = 1 << 25
+GRAPHICS_BRAND = 1 << 26
+SCREEN_TO_BODY = 1 << 27
+BEZEL = 1 << 28
+RATIO_OR_PERCENT = 1 << 29
+SCREEN_RATIO_PERCENT = 1 << 30
+PROCESSOR_LOG_TERM = 1 << 31
+
+SCREEN_RATIO_PERCENTAGES = ("85%", "85.5%", "86%", "87%", "88%", "88.5%", "89%", "90%", "91%", "92%", "93%", "94%", "95%")
+
+CONTEXT_KEYWORD_GROUPS = (
+    (PROCESSOR_WORD, ("processor", "cpu", "prozessor")),
+    (PROCESSOR_DETAIL, (
+        "intel", "amd", "core", "ryzen", "ultra", "i3", "i5", "i7", "i9",
+        "ghz", "mhz", "cores", "kerne", "threads", "thread", "p-core", "e-core"
+    )),
+    (GRAPHICS_WORD, ("gpu", "graphics", "grafik")),
+    # Processor names that appear in GPU/graphics tables
+    (PROCESSOR_NAME, (
+        "u300e", "i3-1315u", "core 3 100u", "core 5 120u", "core 5 220u", "core 7 150u", "core 7 250u",
+        "core ultra 5", "core ultra 7"
+    )),
+    # Processor model numbers (e.g., 225H, 225U, 235H, 235U, 245H, 245U)
+    (PROCESSOR_MODEL, (
+        "225h", "225u", "235h", "235u", "245h", "245u", "255h", "255u",
+        "core ultra 5 225", "core ultra 5 235", "core ultra 5 245",
+        "core ultra 7 155", "core ultra 7 165", "core ultra 7 155h", "core ultra 7 165h"
+    )),
+    (PROCESSOR_MODEL_EXTRA, (
+        "core ultra 5 125u", "core ultra 5 135u", "core ultra 5 125h",
+        "core ultra 7 155u", "core ultra 7 165u"
+    )),
+    # Table-like structure ("|" and "---" are unaffected by lowercasing)
+    (TABLE_MARKER, ("|", "---", "table")),
+    (PIPE, ("|",)),
+    (PROCESSOR_TABLE_WORD, ("processor", "cpu", "core", "ultra", "intel", "amd")),
+    (PROCESSOR_LITERAL, ("processor",)),
+    (MEMORY_WORD, ("memory", "ram", "speicher", "arbeitsspeicher")),
+    (MEMORY_UNIT, ("gb", "ddr4", "ddr5")),
+    (MEMORY_UNIT_EXTRA, ("ddr3", "sodimm")),
+    (STORAGE_WORD, ("storage", "ssd")),
+    (STORAGE_WORD_EXTRA, ("hdd",)),
+    (STORAGE_UNIT, ("gb", "tb", "m.2")),
+    (STORAGE_UNIT_EXTRA, ("capacity",)),
+    (BATTERY_WORD, ("battery", "akku")),
+    (BATTERY_UNIT, ("w", "wh", "capacity")),
+    (WEIGHT_WORD, ("weight", "gewicht")),
+    (WEIGHT_UNIT, ("kg", "lbs", "g")),
+    (DIMENSIONS_WORD, ("dimensions", "abmessungen")),
+    (DIMENSIONS_UNIT, ("mm", "inches", "cm")),
+    (DISPLAY_WORD, ("display", "screen")),
+    (DISPLAY_UNIT, ("nits", "inch", "resolution")),
+    (DISPLAY_UNIT_EXTRA, ("fhd", "uhd", "4k")),
+    (GRAPHICS_BRAND, ("intel", "amd", "nvidia", "arc", "radeon")),
+    (SCREEN_TO_BODY, ("screen-to-body", "screen to body")),
+    (BEZEL, ("bezel", "display bezel", "screen bezel")),
+    (RATIO_OR_PERCENT, ("ratio", "%") + SCREEN_RATIO_PERCENTAGES),
+    (SCREEN_RATIO_PERCENT, SCREEN_RATIO_PERCENTAGES),
+    (PROCESSOR_LOG_TERM, ("processor", "prozessor", "core ultra", "intel core")),
+)
+
+_CONTEXT_MATCHER = KeywordMatcher(CONTEXT_KEYWORD_GROUPS)
+
+
+def chunk_keyword_hits(text_lower: str) -> int:
+    """Hit mask of the context keyword groups in a lowercased chunk text (one scan)."""
+    return _CONTEXT_MATCHER.hits(text_lower)
+
+
+def processor_signals(hits: int, extended_models: bool = False):
+    """
+    Processor indicators of a chunk: (processor keywords, GPU table with processor names,
+    processor model numbers, table structure with processor words).
+    extended_models also counts the additional Core Ultra model numbers.
+    """
+    models = PROCESSOR_MODEL | PROCESSOR_MODEL_EXTRA if extended_models else PROCESSOR_MODEL
+    return (
+        bool(hits & PROCESSOR_WORD) and bool(hits & PROCESSOR_DETAIL),
+        bool(hits & GRAPHICS_WORD) and bool(hits & PROCESSOR_NAME),
+        bool(hits & models),
+        bool(hits & TABLE_MARKER) and bool(hits & PROCESSOR_TABLE_WORD)
+    )
+
+
+def has_component_specs(hits: int) -> bool:
+    """Whether a chunk holds RAM, storage, battery, weight or dimension specs."""
+    return (
+        (bool(hits & MEMORY_WORD) and bool(hits & (MEMORY_UNIT | MEMORY_UNIT_EXTRA)))
+        or (bool(hits & (STORAGE_WORD | STORAGE_WORD_EXTRA)) and bool(hits & (STORAGE_UNIT | STORAGE_UNIT_EXTRA)))
+        or (bool(hits & BATTERY_WORD) and bool(hits & BATTERY_UNIT))
+        or (bool(hits & WEIGHT_WORD) and bool(hits & WEIGHT_UNIT))
+        or (bool(hits & DIMENSIONS_WORD) and bool(hits & DIMENSIONS_UNIT))
+    )
+
+
+def has_display_or_graphics_specs(hits: int) -> bool:
+    """Whether a chunk holds display or graphics specs."""
+    return (
+        (bool(hits & DISPLAY_WORD) and bool(hits & (DISPLAY_UNIT | DISPLAY_UNIT_EXTRA)))
+        or (bool(hits & GRAPHICS_WORD) and bool(hits & GRAPHICS_BRAND))
+    )
+
+
+def is_important_spec_chunk(hits: int) -> bool:
+    """Whether a chunk holds one of the key spec types (processor, RAM, storage, battery, weight, dimensions, display, graphics)."""
+    return any(processor_signals(hits)) or has_component_specs(hits) or has_display_or_graphics_specs(hits)
+
+
+def is_general_spec_chunk(hits: int) -> bool:
+    """Whether a chunk holds a key spec, using the narrower unit lists for general spec questions."""
+    return (
+        (bool(hits & PROCESSOR_WORD) and bool(hits & PROCESSOR_DETAIL))
+        or (bool(hits & BATTERY_WORD) and bool(hits & BATTERY_UNIT))
+        or (bool(hits & WEIGHT_WORD) and bool(hits & WEIGHT_UNIT))
+        or (bool(hits & DIMENSIONS_WORD) and bool(hits & DIMENSIONS_UNIT))
+        or (bool(hits & DISPLAY_WORD) and bool(hits & DISPLAY_UNIT))
+        or (bool(hits & MEMORY_WORD) and bool(hits & MEMORY_UNIT))
+        or (bool(hits & STORAGE_WORD) and bool(hits & STORAGE_UNIT))
+    )
+
+
+def is_screen_to_body_chunk(hits: int) -> bool:
+    """Whether a chunk likely states the screen-to-body ratio."""
+    return (
+        bool(hits & SCREEN_TO_BODY)
+        or (bool(hits & BEZEL) and bool(hits & RATIO_OR_PERCENT))
+        or (bool(hits & DISPLAY_WORD) and bool(hits & SCREEN_RATIO_PERCENT))
+    )
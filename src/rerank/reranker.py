@@ -1,11 +1,37 @@
 """Reranking module using cross-encoder models."""
 from sentence_transformers import CrossEncoder
+from collections import OrderedDict
+from pathlib import Path
 from typing import List
 import os
+import threading
+import torch
 from logging_config.logger import get_logger
 
+try:
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+except ImportError:
+    ORTModelForSequenceClassification = None
+
 logger = get_logger(__name__)
 
+# Cross-encoder runtime: "torch" (default), "onnx" or "onnx-int8" (ONNX Runtime with dynamic INT8 weights)
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch").lower()
+# Exported ONNX models are kept here, one directory per model
+RERANK_ONNX_DIR = os.getenv("RERANK_ONNX_DIR", "./data/onnx_reranker")
+# Run the torch cross-encoder in half precision when it is on a GPU (set RERANK_FP16=0 to disable)
+RERANK_FP16 = os.getenv("RERANK_FP16", "1") != "0"
+
+# Maximum number of document tokenizations kept per reranker
+TOKEN_CACHE_SIZE = 10_000
+# Number of recent rerank orders kept per reranker (repeat queries over the same candidates)
+RERANK_RESULT_CACHE_SIZE = 256
+# Pairs per forward pass (same as CrossEncoder.predict default)
+RERANK_BATCH_SIZE = 32
+# Fallback sequence length if neither model nor tokenizer define a usable one
+DEFAULT_MAX_LENGTH = 512
+
 
 class Reranker:
     """Cross-encoder reranker for improving retrieval quality."""
@@ -39,6 +65,113 @@ class Reranker:
             except Exception as e2:
                 logger.error(f"Failed to load fallback model {fallback_model}: {e2}")
                 raise RuntimeError(f"Could not load any reranker model. Tried {model_name} and {fallback_model}")
+        
+        if RERANK_FP16 and self.model.model.device.type == "cuda":
+            self.model.model.half()
+            logger.info("Reranker running in FP16 on GPU")
+        
+        # Document token ids keyed by text - chunks are re-retrieved across queries,
+        # so only the query has to be tokenized for warm documents
+        self._doc_token_cache: "OrderedDict[str, List[int]]" = OrderedDict()
+        
+        # Top-k orders keyed by (query, top_k, text hashes) - the order only depends on these
+        self._result_cache: "OrderedDict[tuple, List[int]]" = OrderedDict()
+        # Both caches are shared by concurrent requests
+        self._cache_lock = threading.Lock()
+        
+        # Optional ONNX Runtime model used for the batched forward passes instead of torch
+        self._onnx_model = None
+        if RERANK_BACKEND in ("onnx", "onnx-int8"):
+            if ORTModelForSequenceClassification is None:
+                logger.warning(f"RERANK_BACKEND={RERANK_BACKEND} requires optimum[onnxruntime], using torch")
+            else:
+                try:
+                    self._onnx_model = self._load_onnx_model(quantize=RERANK_BACKEND == "onnx-int8")
+                    logger.info(f"Reranker running on ONNX Runtime ({RERANK_BACKEND})")
+                except Exception as e:
+                    logger.warning(f"Failed to load ONNX reranker, using torch: {e}")
+    
+    def _load_onnx_model(self, quantize: bool):
+        """Export the cross-encoder to ONNX once (optionally INT8-quantized) and load it."""
+        export_dir = Path(RERANK_ONNX_DIR) / self.model_name.replace("/", "__")
+        if not (export_dir / "model.onnx").exists():
+            logger.info(f"Exporting reranker {self.model_name} to ONNX in {export_dir}")
+            ORTModelForSequenceClassification.from_pretrained(self.model_name, export=True).save_pretrained(export_dir)
+        if not quantize:
+            return ORTModelForSequenceClassification.from_pretrained(export_dir)
+        
+        if not (export_dir / "model_quantized.onnx").exists():
+            # Dynamic quantization: INT8 weights, activations quantized at runtime - no calibration data needed
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(
+                save_dir=export_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            )
+        return ORTModelForSequenceClassification.from_pretrained(export_dir, file_name="model_quantized.onnx")
+    
+    def _max_length(self) -> int:
+        """Maximum pair length accepted by the cross-encoder."""
+        max_length = getattr(self.model, "max_length", None) or self.model.tokenizer.model_max_length
+        return min(max_length, DEFAULT_MAX_LENGTH) if max_length else DEFAULT_MAX_LENGTH
+    
+    def _doc_token_ids(self, texts: List[str], max_length: int) -> List[List[int]]:
+        """Token ids (without special tokens) for each text, tokenizing only cache misses."""
+        token_ids = [None] * len(texts)
+        missing = []
+        with self._cache_lock:
+            for i, text in enumerate(texts):
+                cached = self._doc_token_cache.get(text)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._doc_token_cache.move_to_end(text)
+                    token_ids[i] = cached
+        
+        if missing:
+            # Tokenized outside the lock
+            encoded = self.model.tokenizer(
+                [texts[i] for i in missing],
+                add_special_tokens=False,
+                truncation=True,
+                max_length=max_length
+            )["input_ids"]
+            with self._cache_lock:
+                for i, ids in zip(missing, encoded):
+                    token_ids[i] = ids
+                    self._doc_token_cache[texts[i]] = ids
+                while len(self._doc_token_cache) > TOKEN_CACHE_SIZE:
+                    self._doc_token_cache.popitem(last=False)
+        
+        logger.debug(f"Reranker token cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        return token_ids
+    
+    def _predict_pretokenized(self, query: str, texts: List[str]) -> List[float]:
+        """Score query-document pairs from cached document tokens (raw logits)."""
+        tokenizer = self.model.tokenizer
+        model = self._onnx_model or self.model.model
+        max_length = self._max_length()
+        
+        query_ids = tokenizer(query, add_special_tokens=False)["input_ids"]
+        doc_ids = self._doc_token_ids(texts, max_length)
+        
+        scores = []
+        with torch.inference_mode():
+            for start in range(0, len(doc_ids), RERANK_BATCH_SIZE):
+                features = [
+                    tokenizer.prepare_for_model(
+                        query_ids,
+                        ids,
+                        truncation="longest_first",
+                        max_length=max_length
+                    )
+                    for ids in doc_ids[start:start + RERANK_BATCH_SIZE]
+                ]
+                batch = tokenizer.pad(features, return_tensors="pt").to(model.device)
+                logits = model(**batch).logits
+                if logits.shape[-1] != 1:
+                    raise ValueError(f"Expected a single relevance logit, got {logits.shape[-1]}")
+                scores.extend(logits[:, 0].float().cpu().tolist())
+        return scores
     
     def rerank(self, query: str, texts: List[str], top_k: int = 3) -> List[int]:
         """
@@ -48,11 +181,22 @@ class Reranker:
         if not texts:
             return []
         
-        # Create query-document pairs
-        pairs = [[query, text] for text in texts]
+        cache_key = (query, top_k, tuple(hash(text) for text in texts))
+        with self._cache_lock:
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                self._result_cache.move_to_end(cache_key)
+        if cached is not None:
+            logger.info(f"Reused rerank order for {len(texts)} documents")
+            return list(cached)
         
-        # Get scores
-        scores = self.model.predict(pairs)
+        # Get scores - the activation is monotonic, so raw logits give the same order
+        try:
+            scores = self._predict_pretokenized(query, texts)
+        except Exception as e:
+            logger.warning(f"Pre-tokenized reranking failed, falling back to predict: {e}")
+            pairs = [[query, text] for text in texts]
+            scores = self.model.predict(pairs)
         
         # Get top_k indices
         top_indices = sorted(
@@ -61,6 +205,11 @@ class Reranker:
             reverse=True
         )[:top_k]
         
+        with self._cache_lock:
+            self._result_cache[cache_key] = list(top_indices)
+            while len(self._result_cache) > RERANK_RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+        
         logger.info(f"Reranked {len(texts)} documents, returning top {top_k}")
         return top_indices
     
@@ -0,0 +1,246 @@
+"""Caches for the retrieval hot path."""
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from logging_config.logger import get_logger
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+logger = get_logger(__name__)
+
+
+def _normalize(vector) -> np.ndarray:
+    """Return a float32 unit vector."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def quantize(vector: np.ndarray):
+    """Symmetric int8 quantization of a vector; returns (int8 vector, scale)."""
+    scale = float(np.max(np.abs(vector))) / 127.0
+    if scale == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8), 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+def approximate_similarities(query: np.ndarray, matrix: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Approximate similarity ranking of an int8 query against int8 rows with per-row scales."""
+    if simsimd is not None:
+        distances = np.asarray(simsimd.cdist(query[None, :], matrix, metric="cosine"))
+        return 1.0 - distances.reshape(-1)
+    # Accumulate in int32 - an int8 matmul would overflow
+    return (matrix.astype(np.int32) @ query.astype(np.int32)) * scales
+
+
+class _ScopeEntries:
+    """Cached results of one scope with a stacked int8 key matrix for lookups."""
+
+    def __init__(self):
+        self.keys: List[np.ndarray] = []
+        self.scales: List[float] = []
+        self.results: List[List[Dict]] = []
+        self.timestamps: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._scale_column: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.keys)
+            self._scale_column = np.asarray(self.scales, dtype=np.float32)
+        return self._matrix
+
+    def scale_column(self) -> np.ndarray:
+        self.matrix()
+        return self._scale_column
+
+    def append(self, embedding: np.ndarray, results: List[Dict], timestamp: float):
+        key, scale = quantize(embedding)
+        self.keys.append(key)
+        self.scales.append(scale)
+        self.results.append(results)
+        self.timestamps.append(timestamp)
+        self._matrix = None
+
+    def pop_oldest(self):
+        del self.keys[0]
+        del self.scales[0]
+        del self.results[0]
+        del self.timestamps[0]
+        self._matrix = None
+
+    def cosine(self, index: int, query: np.ndarray) -> float:
+        """Float32 cosine between a unit query and a dequantized key."""
+        return float(np.dot(_normalize(self.keys[index] * np.float32(self.scales[index])), query))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class SemanticResultCache:
+    """
+    Bounded cache of retrieval results keyed by query embedding.
+    A lookup hits when a cached query of the same scope has cosine similarity >= threshold.
+    Keys are stored as int8; the int8 scan picks the best candidate, which is then
+    confirmed with a float32 cosine.
+    The scope must capture everything besides the embedding that affects the results
+    (n_results, metadata filter, target product/generation, index version, ...).
+    Safe to share between request threads.
+    """
+
+    def __init__(
+        self,
+        max_entries_per_scope: int = 1024,
+        max_scopes: int = 256,
+        threshold: float = 0.97,
+        ttl_seconds: float = 300.0
+    ):
+        self.max_entries_per_scope = max_entries_per_scope
+        self.max_scopes = max_scopes
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._scopes: "OrderedDict[Hashable, _ScopeEntries]" = OrderedDict()
+        # Lookups stack and scan a scope's keys, which must not change under them
+        self._lock = threading.Lock()
+
+    def _expire(self, entries: _ScopeEntries, now: float):
+        while len(entries) and now - entries.timestamps[0] > self.ttl_seconds:
+            entries.pop_oldest()
+
+    def get(self, scope: Hashable, embedding) -> Optional[List[Dict]]:
+        """Return cached results for a near-identical query in the same scope, if any."""
+        query = _normalize(embedding)
+        query_key, _ = quantize(query)
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                return None
+            self._expire(entries, time.monotonic())
+            if not len(entries):
+                del self._scopes[scope]
+                return None
+
+            best = int(np.argmax(approximate_similarities(query_key, entries.matrix(), entries.scale_column())))
+            if entries.cosine(best, query) < self.threshold:
+                return None
+            self._scopes.move_to_end(scope)
+            return list(entries.results[best])
+
+    def put(self, scope: Hashable, embedding, results: List[Dict]):
+        """Store results for a query embedding."""
+        key = _normalize(embedding)
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                entries = _ScopeEntries()
+                self._scopes[scope] = entries
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope)
+            entries.append(key, list(results), time.monotonic())
+            while len(entries) > self.max_entries_per_scope:
+                entries.pop_oldest()
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+
+
+class PersistentEmbeddingStore:
+    """
+    Query embeddings on disk (SQLite), so a restarted process does not re-embed recent queries.
+    Rows are keyed by (model name, hash of the embedded text); rows of other models, and all but
+    the newest max_rows rows, are dropped when the store is opened. The database is opened lazily on first use; if it cannot be
+    opened the store disables itself and every lookup misses.
+    """
+
+    def __init__(self, path: str, model_name: str, max_rows: int = 100_000):
+        self.path = path
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = not path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(model_name TEXT NOT NULL, qhash BLOB NOT NULL, vec BLOB NOT NULL, ts REAL NOT NULL, "
+                    "PRIMARY KEY (model_name, qhash))"
+                )
+                # Embeddings of another model are useless (and may have another dimension)
+                conn.execute("DELETE FROM query_embeddings WHERE model_name != ?", (self.model_name,))
+                # Keep the store bounded: only the most recently written rows survive a restart
+                conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid NOT IN "
+                    "(SELECT rowid FROM query_embeddings ORDER BY ts DESC LIMIT ?)",
+                    (self.max_rows,)
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding store at {self.path} disabled: {e}")
+                self._disabled = True
+        return self._conn
+
+    def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Return the stored embeddings of the given texts (texts without one are left out)."""
+        if not texts:
+            return {}
+        keys = {self._key(text): text for text in texts}
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {}
+            key_list = list(keys)
+            rows = []
+            try:
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(key_list), 500):
+                    batch = key_list[start:start + 500]
+                    rows.extend(conn.execute(
+                        "SELECT qhash, vec FROM query_embeddings WHERE model_name = ? "
+                        f"AND qhash IN ({','.join('?' * len(batch))})",
+                        (self.model_name, *batch)
+                    ).fetchall())
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding store lookup failed: {e}")
+                return {}
+        return {keys[bytes(qhash)]: np.frombuffer(vec, dtype=np.float32).tolist() for qhash, vec in rows}
+
+    def put_many(self, embeddings: Dict[str, List[float]]):
+        """Store embeddings by text."""
+        if not embeddings:
+            return
+        now = time.time()
+        rows = [
+            (self.model_name, self._key(text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in embeddings.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.executemany("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)", rows)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding store write failed: {e}")
@@ -0,0 +1,93 @@
+"""Multi-keyword substring matching with optional Hyperscan / Aho-Corasick backends."""
+from typing import Sequence, Tuple
+import threading
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _literal_pattern(keyword: str) -> bytes:
+    """Hyperscan pattern matching the UTF-8 bytes of a keyword literally."""
+    return b"".join(b"\\x%02x" % byte for byte in keyword.encode("utf-8"))
+
+
+def _on_hyperscan_match(pattern_id, start, end, flags, context):
+    context[0] |= context[1][pattern_id]
+
+
+class KeywordMatcher:
+    """
+    Reports which keyword groups occur in a text as a bitmask.
+    Groups are (flag, keywords) pairs; a group matches if any keyword is a substring of the text.
+    Uses Hyperscan when installed, else pyahocorasick, else plain substring checks.
+    """
+
+    def __init__(self, groups: Sequence[Tuple[int, Tuple[str, ...]]]):
+        self.groups = tuple(groups)
+        keyword_flags = {}
+        for flag, keywords in self.groups:
+            for keyword in keywords:
+                keyword_flags[keyword] = keyword_flags.get(keyword, 0) | flag
+
+        self._database = None
+        self._automaton = None
+        if hyperscan is not None:
+            self._build_database(keyword_flags)
+        elif ahocorasick is not None:
+            self._automaton = self._build_automaton(keyword_flags)
+
+    def _build_database(self, keyword_flags):
+        """Compile all keywords into one Hyperscan block-mode database."""
+        keywords = list(keyword_flags)
+        self._pattern_flags = [keyword_flags[keyword] for keyword in keywords]
+        self._database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        self._database.compile(
+            expressions=[_literal_pattern(keyword) for keyword in keywords],
+            ids=list(range(len(keywords))),
+            elements=len(keywords),
+            # Only whether a keyword occurs matters, not how often
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(keywords)
+        )
+        # Hyperscan scratch space must not be shared between concurrent scans
+        self._scratch = threading.local()
+
+    def _build_automaton(self, keyword_flags):
+        """Build an Aho-Corasick automaton mapping each keyword to the OR of its groups' flags."""
+        automaton = ahocorasick.Automaton()
+        for keyword, flag in keyword_flags.items():
+            automaton.add_word(keyword, flag)
+        automaton.make_automaton()
+        return automaton
+
+    def hits(self, text: str) -> int:
+        """Bitmask of the keyword groups occurring in the text."""
+        if self._database is not None:
+            scratch = getattr(self._scratch, "scratch", None)
+            if scratch is None:
+                scratch = self._scratch.scratch = hyperscan.Scratch(self._database)
+            context = [0, self._pattern_flags]
+            self._database.scan(
+                text.encode("utf-8"),
+                match_event_handler=_on_hyperscan_match,
+                context=context,
+                scratch=scratch
+            )
+            return context[0]
+
+        hits = 0
+        if self._automaton is not None:
+            # One pass over the text reports every keyword occurrence
+            for _, flag in self._automaton.iter(text):
+                hits |= flag
+            return hits
+        for flag, keywords in self.groups:
+            if any(keyword in text for keyword in keywords):
+                hits |= flag
+        return hits
@@ -0,0 +1,218 @@
+"""Query classification for retrieval (spec detection, product targeting, query expansion)."""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import re
+from src.retrieval.keywords import KeywordMatcher
+
+# Model names (E14, E16, L14, P15v, etc.) - pattern: letter(s) followed by numbers
+MODEL_RE = re.compile(r'\b([a-z]\d{1,2}|[a-z]{2}\d{1,2})\b')
+# Generation numbers (Gen X, Generation X, GenX)
+GEN_RE = re.compile(r'\b(?:gen|generation)\s*(\d+)\b')
+# Both of the above in one alternation, so a text is scanned once for models and generations
+MODEL_GEN_RE = re.compile(
+    r'\b(?P<model>[a-z]\d{1,2}|[a-z]{2}\d{1,2})\b|\b(?:gen|generation)\s*(?P<gen>\d+)\b'
+)
+
+
+def find_models_and_gens(text_lower: str) -> Tuple[List[str], List[str]]:
+    """Return (model matches, generation numbers) of a lowercased text, as MODEL_RE/GEN_RE findall would."""
+    models = []
+    gens = []
+    for match in MODEL_GEN_RE.finditer(text_lower):
+        model = match.group("model")
+        if model is not None:
+            models.append(model)
+        else:
+            gens.append(match.group("gen"))
+    return models, gens
+
+
+# Query terms that mark specification queries (matched as substrings of the lowercased query)
+SPEC_KEYWORDS = ("spezifikation", "specification", "specs", "technische", "hardware")
+SPEC_QUESTION_PATTERNS = (
+    "wieviel", "wie viel", "welche", "was ist", "welcher", "welches",
+    "ram", "memory", "speicher", "prozessor", "cpu", "grafik", "gpu",
+    "display", "bildschirm", "akku", "battery", "gewicht", "weight",
+    "abmessungen", "dimensions", "anschlüsse", "ports"
+)
+PROCESSOR_QUERY_TERMS = (
+    "prozessor", "prozessoren", "processor", "processors", "cpu", "cpus",
+    "welche prozessor", "welche processor", "prozessor-konfiguration",
+    "prozessoroptionen", "prozessor-optionen"
+)
+SCREEN_TO_BODY_QUERY_TERMS = (
+    "screen-to-body", "screen to body", "screen-to-body ratio", "screen to body ratio",
+    "bezel", "display bezel", "screen bezel"
+)
+
+
+@dataclass(frozen=True)
+class QueryFeatures:
+    """Everything derived from the query text that drives retrieval."""
+    query: str
+    query_lower: str
+    is_spec_query: bool
+    product_keywords: Tuple[str, ...]
+    target_product: Optional[str]
+    target_gen: Optional[int]
+    mentions_thinkpad: bool
+    is_processor_query: bool
+    is_screen_to_body_query: bool
+    spec_type: Optional[str]
+    # Text sent to the embedder (the expanded query for spec queries)
+    embedding_text: str
+
+
+# Targeted expansion keywords per spec type
+SPEC_EXPANSIONS = {
+    "brightness": "display brightness Helligkeit nits cd/m2 cd/m² luminance luminanz screen display specifications 300 nits typical brightness",
+    "ram": "RAM memory DDR4 DDR5 DDR3 GB gigabytes 16GB 32GB 64GB 8GB memory specifications",
+    "weight": "weight Weight Gewicht kg lbs pounds kilogram starting at mechanical dimensions size mass specifications",
+    "dimensions": "dimensions Dimensions Abmessungen WxDxH width height depth mm inches mechanical size specifications",
+    # Emphasize "Screen-to-Body Ratio" strongly and add percentage variations
+    # Also add display-related keywords to find display specification chunks
+    "screen_to_body": "Screen-to-Body Ratio Screen to Body Ratio screen-to-body ratio screen to body ratio bezel display bezel screen bezel ratio percentage % 85% 85.5% 86% 87% 88% 88.5% 89% 90% 91% 92% 93% 94% 95% display Display screen Screen panel Panel specifications specifications table Table WUXGA FHD resolution brightness nits",
+    "display": "display Display screen panel IPS LCD OLED FHD UHD resolution inch inches nits brightness specifications",
+    "battery": "battery Battery Akku Wh capacity power cells life runtime specifications",
+    # For general spec questions, add comprehensive technical keywords
+    # Emphasize processor keywords strongly
+    "general": "processor CPU Prozessor cores Kerne threads Threads frequency Taktfrequenz cache Intel AMD Core Ultra Ryzen i3 i5 i7 i9 GHz MHz memory RAM DDR4 DDR5 storage SSD HDD graphics GPU display screen resolution brightness nits cd/m2 luminance Helligkeit battery capacity power adapter dimensions weight size ports connectivity USB Thunderbolt HDMI",
+}
+
+# PERFORMANCE section keywords to find technical specification chunks
+# These keywords help find chunks that contain the PERFORMANCE section with all specs
+# Also add specific keywords for Display, Battery, Dimensions/Weight, and Processor to ensure these are found
+PERFORMANCE_KEYWORDS = "PERFORMANCE PERFORMANCE section PERFORMANCE specifications technical specifications processor CPU Prozessor Intel AMD Core Ultra Ryzen i3 i5 i7 i9 i11 cores Kerne threads Threads frequency Taktfrequenz GHz MHz cache memory RAM DDR4 DDR5 16GB 32GB 64GB storage SSD HDD graphics GPU display screen resolution brightness nits cd/m2 luminance Helligkeit panel IPS LCD OLED battery akku batterie power adapter W Wh capacity life dimensions abmessungen weight gewicht size width height depth mm inches kg lbs ports connectivity"
+
+# Spec type detection in priority order - the first matching entry wins
+SPEC_TYPE_TERMS = (
+    # Display brightness specific - CHECK THIS FIRST before RAM to avoid misclassification
+    ("brightness", ("helligkeit", "brightness", "nits", "luminance", "luminanz")),
+    ("ram", ("ram", "memory", "speicher", "arbeitsspeicher")),
+    # Weight/Dimensions specific - add strong cross-language keywords
+    ("weight", ("gewicht", "weight", "schwer", "leicht", "kg", "lbs", "gramm")),
+    ("dimensions", ("abmessung", "dimension", "größe", "maße", "breite", "höhe", "tiefe")),
+    # Screen-to-Body Ratio specific - CHECK THIS BEFORE general display
+    ("screen_to_body", ("screen-to-body", "screen to body", "screen-to-body ratio", "screen to body ratio", "bezel", "display bezel", "screen bezel", "ratio")),
+    # Display specific (not brightness)
+    ("display", ("display", "bildschirm", "screen", "monitor", "auflösung", "resolution")),
+    ("battery", ("akku", "battery", "batterie", "laufzeit", "wh", "kapazität")),
+)
+
+
+# Query term groups, all matched in one pass over the lowercased query
+_Q_SPEC = 1 << 0
+_Q_PROCESSOR = 1 << 1
+_Q_SCREEN_TO_BODY = 1 << 2
+_Q_THINKPAD = 1 << 3
+_Q_ZBOOK = 1 << 4
+_Q_IDEAPAD = 1 << 5
+_Q_SPEC_TYPE_SHIFT = 8  # One bit per SPEC_TYPE_TERMS entry from here on
+
+_QUERY_MATCHER = KeywordMatcher(
+    (
+        (_Q_SPEC, SPEC_KEYWORDS + SPEC_QUESTION_PATTERNS),
+        (_Q_PROCESSOR, PROCESSOR_QUERY_TERMS),
+        (_Q_SCREEN_TO_BODY, SCREEN_TO_BODY_QUERY_TERMS),
+        (_Q_THINKPAD, ("thinkpad", "think pad")),
+        (_Q_ZBOOK, ("zbook",)),
+        (_Q_IDEAPAD, ("ideapad",)),
+    ) + tuple(
+        (1 << (_Q_SPEC_TYPE_SHIFT + index), terms)
+        for index, (_, terms) in enumerate(SPEC_TYPE_TERMS)
+    )
+)
+
+
+def _spec_type(hits: int) -> str:
+    """Return the spec type of a specification query from its term hits."""
+    for index, (spec_type, _) in enumerate(SPEC_TYPE_TERMS):
+        if hits & (1 << (_Q_SPEC_TYPE_SHIFT + index)):
+            return spec_type
+    return "general"
+
+
+@lru_cache(maxsize=2048)
+def _build_expansion(spec_type: str, product_keywords: Tuple[str, ...], gen_num: Optional[str]) -> str:
+    """Expansion appended to a spec query; shared by all phrasings with the same spec type and product."""
+    parts = []
+    if product_keywords:
+        # Emphasize product name by repeating it (as separate tokens, not glued "e14thinkpad")
+        parts.append(" ".join(product_keywords * 2))
+    parts.append(SPEC_EXPANSIONS[spec_type])
+    if gen_num is not None:
+        parts.append(f"Gen {gen_num} Generation {gen_num} {gen_num}th generation")
+    parts.append(PERFORMANCE_KEYWORDS)
+    return " ".join(parts)
+
+
+@lru_cache(maxsize=1024)
+def classify_query(query: str) -> QueryFeatures:
+    """Classify a query once; the result is immutable and memoized per query string."""
+    query_lower = query.lower()
+    hits = _QUERY_MATCHER.hits(query_lower)
+
+    # Detect spec queries by keywords OR by question patterns asking for specific values
+    is_spec_query = bool(hits & _Q_SPEC)
+    mentions_thinkpad = bool(hits & _Q_THINKPAD)
+
+    # Extract product/model name from query to improve specificity
+    product_keywords = []
+
+    # Detect product brand
+    if mentions_thinkpad:
+        product_keywords.append("thinkpad")
+    elif hits & _Q_ZBOOK:
+        product_keywords.append("zbook")
+    elif hits & _Q_IDEAPAD:
+        product_keywords.append("ideapad")
+
+    model_matches, gen_matches = find_models_and_gens(query_lower)
+    for model_match in model_matches:
+        if model_match not in product_keywords:
+            product_keywords.append(model_match)
+
+    for gen_num in gen_matches:
+        product_keywords.append(f"gen {gen_num}")
+        product_keywords.append(f"generation {gen_num}")
+
+    # Product/model and generation used for filtering results
+    target_product = None
+    target_gen = None
+    if model_matches:
+        # Use the first model found, but prioritize longer matches (e.g., "p15v" over "p15")
+        target_product = max(model_matches, key=len)
+        if gen_matches:
+            target_gen = int(gen_matches[0])
+
+    # Handle special cases for multi-word model names
+    if "zbook ultra 14" in query_lower:
+        target_product = "zbook ultra 14"
+    elif "zbook 8 14" in query_lower:
+        target_product = "zbook 8 14"
+    elif "zbook 8 16" in query_lower:
+        target_product = "zbook 8 16"
+
+    spec_type = None
+    embedding_text = query
+    if is_spec_query:
+        # Expand query with technical terms while emphasizing the specific product name
+        # This helps find technical chunks while maintaining relevance to the specific product
+        spec_type = _spec_type(hits)
+        gen_num = gen_matches[0] if gen_matches else None  # Use first generation found
+        embedding_text = f"{query} {_build_expansion(spec_type, tuple(product_keywords), gen_num)}"
+
+    return QueryFeatures(
+        query=query,
+        query_lower=query_lower,
+        is_spec_query=is_spec_query,
+        product_keywords=tuple(product_keywords),
+        target_product=target_product,
+        target_gen=target_gen,
+        mentions_thinkpad=mentions_thinkpad,
+        is_processor_query=bool(hits & _Q_PROCESSOR),
+        is_screen_to_body_query=bool(hits & _Q_SCREEN_TO_BODY),
+        spec_type=spec_type,
+        embedding_text=embedding_text
+    )
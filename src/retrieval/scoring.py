@@ -0,0 +1,341 @@
+"""Chunk feature flags and similarity boost scoring for specification queries."""
+from typing import Dict, Optional
+import numpy as np
+from src.retrieval.keywords import KeywordMatcher
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Minimum length for a chunk to count as substantial (tables, spec sections)
+SUBSTANTIAL_CHUNK_LENGTH = 200
+
+# Feature flags - one bit per keyword group found in a chunk
+FLAG_SUBSTANTIAL = 1 << 0         # Chunk is longer than SUBSTANTIAL_CHUNK_LENGTH
+FLAG_PERFORMANCE = 1 << 1         # PERFORMANCE section
+FLAG_PROCESSOR_WORD = 1 << 2      # processor / cpu / prozessor
+FLAG_PROCESSOR_DETAIL = 1 << 3    # CPU brand or clock/core details
+FLAG_GRAPHICS_WORD = 1 << 4       # gpu / graphics / grafik
+FLAG_PROCESSOR_NAME = 1 << 5      # Explicit processor model names (GPU tables)
+FLAG_CORE_TECH = 1 << 6           # Core technical keywords
+FLAG_SCREEN_TO_BODY = 1 << 7      # Explicit screen-to-body mention
+FLAG_BEZEL = 1 << 8               # Bezel mention
+FLAG_RATIO = 1 << 9               # "ratio" or a percent sign
+FLAG_DISPLAY_PERCENT = 1 << 10    # Typical screen-to-body percentages
+FLAG_DISPLAY_WORD = 1 << 11       # display / screen / bildschirm
+FLAG_BRIGHTNESS_UNIT = 1 << 12    # nits, cd/m2, brightness, ...
+FLAG_DISPLAY_MEASURE = 1 << 13    # Resolution, inch, screen sizes
+FLAG_BATTERY_WORD = 1 << 14       # battery / akku / power adapter
+FLAG_BATTERY_UNIT = 1 << 15       # Wh, capacity, runtime, ...
+FLAG_DIMENSION_WORD = 1 << 16     # dimensions / size / weight
+FLAG_DIMENSION_UNIT = 1 << 17     # mm, kg, width, ...
+FLAG_DIMENSIONS = 1 << 18         # "dimensions" or weight with a unit
+FLAG_BATTERY = 1 << 19            # battery / akku or power adapter with a unit
+FLAG_TECH_ANY = 1 << 20           # Any technical keyword
+
+PROCESSOR_WORDS = ("processor", "cpu", "prozessor")
+PROCESSOR_DETAILS = (
+    "intel", "amd", "core", "ryzen", "ultra", "i3", "i5", "i7", "i9",
+    "ghz", "mhz", "cores", "kerne", "threads", "thread", "p-core", "e-core"
+)
+GRAPHICS_WORDS = ("gpu", "graphics", "grafik")
+PROCESSOR_NAMES = (
+    "u300e", "i3-1315u", "core 3 100u", "core 5 120u", "core 5 220u", "core 7 150u",
+    "core 7 250u", "core ultra 5", "core ultra 7", "processor", "intel processor"
+)
+CORE_TECH_WORDS = ("processor", "cpu", "memory", "ram", "storage", "graphics", "gpu")
+SCREEN_TO_BODY_WORDS = ("screen-to-body", "screen to body")
+RATIO_WORDS = ("ratio", "%")
+DISPLAY_PERCENTAGES = ("85%", "85.5%", "86%", "87%", "88%", "88.5%", "89%", "90%", "91%", "92%", "93%", "94%", "95%")
+DISPLAY_WORDS = ("display", "screen", "bildschirm")
+BRIGHTNESS_UNITS = ("nits", "cd/m2", "cd/m²", "brightness", "helligkeit", "luminance", "luminanz")
+DISPLAY_MEASURES = (
+    "resolution", "auflösung", "inch", "inches", "\"", "fhd", "uhd", "4k", "1920", "2560", "3840",
+    "14", "15", "16"  # Screen sizes
+)
+BATTERY_WORDS = ("battery", "akku", "batterie", "power adapter", "power supply")
+BATTERY_UNITS = ("w", "wh", "watt", "capacity", "kapazität", "life", "laufzeit", "mah", "hours", "stunden")
+DIMENSION_WORDS = ("dimensions", "abmessungen", "size", "weight", "gewicht")
+DIMENSION_UNITS = (
+    "mm", "inches", "kg", "lbs", "pounds", "g", "x", "×", "cm",
+    "width", "height", "depth", "breite", "höhe", "tiefe", "length", "länge"
+)
+WEIGHT_UNITS = ("kg", "lbs", "mm", "inches")
+POWER_ADAPTER_UNITS = ("w", "wh")
+TECH_ANY_WORDS = (
+    "processor", "cpu", "memory", "ram", "storage", "graphics", "gpu",
+    "display", "battery", "dimensions", "weight"
+)
+
+
+# Processor tables: table markers plus processor words
+FLAG_TABLE_MARKER = 1 << 21       # "|", "---" or "table"
+FLAG_PROCESSOR_TABLE_WORD = 1 << 22  # processor / cpu / core / ultra / intel / amd
+FLAG_PERCENT = 1 << 23            # Any percent sign
+
+TABLE_MARKERS = ("|", "---", "table")
+PROCESSOR_TABLE_WORDS = ("processor", "cpu", "core", "ultra", "intel", "amd")
+
+# Spec-query sort priority groups
+FLAG_DISPLAY_OR_SCREEN = 1 << 24      # display / screen
+FLAG_BATTERY_OR_AKKU = 1 << 25        # battery / akku
+FLAG_BATTERY_SPEC_UNIT = 1 << 26      # w, wh, capacity
+FLAG_WEIGHT_WORD = 1 << 27            # weight / gewicht
+FLAG_WEIGHT_SPEC_UNIT = 1 << 28       # kg, lbs, g
+FLAG_DIMENSIONS_WORD = 1 << 29        # dimensions / abmessungen
+FLAG_DIMENSIONS_SPEC_UNIT = 1 << 30   # mm, inches, cm
+FLAG_BRIGHTNESS_WORD = 1 << 31        # nits, brightness, helligkeit, luminance
+FLAG_DISPLAY_SIZE_WORD = 1 << 32      # inch / resolution
+FLAG_CORE_SPEC = 1 << 33              # processor, cpu, memory, ram, storage
+
+# Helper hits for the compound flags, masked out of the final result
+_HIT_WEIGHT = 1 << 40
+_HIT_WEIGHT_UNIT = 1 << 41
+_HIT_DIMENSIONS = 1 << 42
+_HIT_POWER_ADAPTER = 1 << 43
+_HIT_POWER_ADAPTER_UNIT = 1 << 44
+_HIT_MASK = (1 << 40) - 1
+
+# Keyword groups - a flag is set when any of its keywords occurs as a substring
+KEYWORD_GROUPS = (
+    (FLAG_PERFORMANCE, ("performance",)),
+    (FLAG_PROCESSOR_WORD, PROCESSOR_WORDS),
+    (FLAG_PROCESSOR_DETAIL, PROCESSOR_DETAILS),
+    (FLAG_GRAPHICS_WORD, GRAPHICS_WORDS),
+    (FLAG_PROCESSOR_NAME, PROCESSOR_NAMES),
+    (FLAG_CORE_TECH, CORE_TECH_WORDS),
+    (FLAG_SCREEN_TO_BODY, SCREEN_TO_BODY_WORDS),
+    (FLAG_BEZEL, ("bezel",)),
+    (FLAG_RATIO, RATIO_WORDS),
+    (FLAG_DISPLAY_PERCENT, DISPLAY_PERCENTAGES),
+    (FLAG_DISPLAY_WORD, DISPLAY_WORDS),
+    (FLAG_BRIGHTNESS_UNIT, BRIGHTNESS_UNITS),
+    (FLAG_DISPLAY_MEASURE, DISPLAY_MEASURES),
+    (FLAG_BATTERY_WORD, BATTERY_WORDS),
+    (FLAG_BATTERY_UNIT, BATTERY_UNITS),
+    (FLAG_DIMENSION_WORD, DIMENSION_WORDS),
+    (FLAG_DIMENSION_UNIT, DIMENSION_UNITS),
+    (FLAG_TECH_ANY, TECH_ANY_WORDS),
+    (FLAG_TABLE_MARKER, TABLE_MARKERS),
+    (FLAG_PROCESSOR_TABLE_WORD, PROCESSOR_TABLE_WORDS),
+    (FLAG_PERCENT, ("%",)),
+    (_HIT_WEIGHT, ("weight",)),
+    (_HIT_WEIGHT_UNIT, WEIGHT_UNITS),
+    (_HIT_DIMENSIONS, ("dimensions",)),
+    (FLAG_DISPLAY_OR_SCREEN, ("display", "screen")),
+    (FLAG_BATTERY_OR_AKKU, ("battery", "akku")),
+    (FLAG_BATTERY_SPEC_UNIT, ("w", "wh", "capacity")),
+    (FLAG_WEIGHT_WORD, ("weight", "gewicht")),
+    (FLAG_WEIGHT_SPEC_UNIT, ("kg", "lbs", "g")),
+    (FLAG_DIMENSIONS_WORD, ("dimensions", "abmessungen")),
+    (FLAG_DIMENSIONS_SPEC_UNIT, ("mm", "inches", "cm")),
+    (FLAG_BRIGHTNESS_WORD, ("nits", "brightness", "helligkeit", "luminance")),
+    (FLAG_DISPLAY_SIZE_WORD, ("inch", "resolution")),
+    (FLAG_CORE_SPEC, ("processor", "cpu", "memory", "ram", "storage")),
+    (_HIT_POWER_ADAPTER, ("power adapter",)),
+    (_HIT_POWER_ADAPTER_UNIT, POWER_ADAPTER_UNITS),
+)
+
+
+_CHUNK_MATCHER = KeywordMatcher(KEYWORD_GROUPS)
+
+
+def chunk_feature_flags(text_lower: str, text_length: int) -> int:
+    """Compute the feature flag bitmask of a chunk from its lowercased text."""
+    hits = _CHUNK_MATCHER.hits(text_lower)
+    flags = hits & _HIT_MASK
+    if text_length > SUBSTANTIAL_CHUNK_LENGTH:
+        flags |= FLAG_SUBSTANTIAL
+    if hits & _HIT_DIMENSIONS or (hits & _HIT_WEIGHT and hits & _HIT_WEIGHT_UNIT):
+        flags |= FLAG_DIMENSIONS
+    if hits & FLAG_BATTERY_OR_AKKU or (hits & _HIT_POWER_ADAPTER and hits & _HIT_POWER_ADAPTER_UNIT):
+        flags |= FLAG_BATTERY
+    return flags
+
+
+# Bump when keyword groups or flag bits change so flags stored at index time are ignored
+KW_FLAGS_VERSION = 2
+
+
+def keyword_flag_metadata(text: str) -> Dict[str, int]:
+    """Chunk keyword flags to store in the vector store metadata at index time."""
+    flags = chunk_feature_flags(text.lower(), len(text))
+    return {
+        "kw_flags": flags,
+        "kw_flags_version": KW_FLAGS_VERSION,
+        # Chunks that would receive a spec-query boost; lets spec queries pre-filter in the vector store
+        "kw_technical": bool(boosts_for_flags(np.array([flags]))[0] > 0)
+    }
+
+
+def stored_feature_flags(metadata: Optional[Dict]) -> Optional[int]:
+    """Return the index-time keyword flags of a chunk, or None if missing or outdated."""
+    if not metadata or metadata.get("kw_flags_version") != KW_FLAGS_VERSION:
+        return None
+    flags = metadata.get("kw_flags")
+    return int(flags) if flags is not None else None
+
+
+def is_processor_chunk(flags: int) -> bool:
+    """Processor words with brand/model details, or a table listing processors."""
+    return (
+        (flags & FLAG_PROCESSOR_WORD and flags & FLAG_PROCESSOR_DETAIL) or
+        (flags & FLAG_TABLE_MARKER and flags & FLAG_PROCESSOR_TABLE_WORD)
+    ) != 0
+
+
+# Boost tiers in priority order - the first matching tier wins.
+# Each tier lists alternative flag combinations; a combination matches if all its flags are set.
+BOOST_TIERS = (
+    # PERFORMANCE section in a substantial chunk
+    (0.25, (FLAG_PERFORMANCE | FLAG_SUBSTANTIAL,)),
+    # Processor chunks with model info, or GPU tables listing processors
+    (0.24, (FLAG_PROCESSOR_WORD | FLAG_PROCESSOR_DETAIL | FLAG_SUBSTANTIAL,
+            FLAG_GRAPHICS_WORD | FLAG_PROCESSOR_NAME | FLAG_SUBSTANTIAL)),
+    # Technical keywords in a substantial chunk
+    (0.20, (FLAG_CORE_TECH | FLAG_SUBSTANTIAL,)),
+    # Explicit screen-to-body ratio mentions
+    (0.45, (FLAG_SCREEN_TO_BODY,)),
+    # Bezel with ratio/percentage
+    (0.40, (FLAG_BEZEL | FLAG_RATIO,)),
+    # Display chunks with percentage - likely screen-to-body ratio
+    (0.38, (FLAG_DISPLAY_WORD | FLAG_DISPLAY_PERCENT,)),
+    # Display chunks with brightness/nits
+    (0.35, (FLAG_DISPLAY_WORD | FLAG_BRIGHTNESS_UNIT,)),
+    # Display chunks with other measurements
+    (0.30, (FLAG_DISPLAY_WORD | FLAG_DISPLAY_MEASURE,)),
+    # Battery chunks with capacity info
+    (0.28, (FLAG_BATTERY_WORD | FLAG_BATTERY_UNIT,)),
+    # Dimensions/weight chunks with measurements
+    (0.26, (FLAG_DIMENSION_WORD | FLAG_DIMENSION_UNIT,)),
+    # Display chunks without measurements
+    (0.19, (FLAG_DISPLAY_WORD,)),
+    # Dimensions/weight chunks
+    (0.18, (FLAG_DIMENSIONS,)),
+    # Battery/power adapter chunks
+    (0.18, (FLAG_BATTERY,)),
+    # PERFORMANCE in smaller chunks
+    (0.15, (FLAG_PERFORMANCE,)),
+    # Any technical keyword
+    (0.10, (FLAG_TECH_ANY,)),
+)
+
+
+def _build_boost_lut() -> np.ndarray:
+    """Map every combination of matched tiers to the boost of its highest-priority tier."""
+    lut = np.zeros(1 << len(BOOST_TIERS), dtype=np.float32)
+    # Fill from the lowest-priority tier up so higher-priority tiers overwrite
+    for tier in reversed(range(len(BOOST_TIERS))):
+        bit = 1 << tier
+        masks = np.arange(lut.size)
+        lut[(masks & bit) != 0] = BOOST_TIERS[tier][0]
+    return lut
+
+
+BOOST_LUT = _build_boost_lut()
+
+
+def boosts_for_flags(flags: np.ndarray) -> np.ndarray:
+    """Vectorized similarity boost for an array of chunk feature flags."""
+    flags = np.asarray(flags, dtype=np.uint64)
+    tier_bits = np.zeros(flags.shape, dtype=np.uint16)
+    for tier, (_, combinations) in enumerate(BOOST_TIERS):
+        matched = np.zeros(flags.shape, dtype=bool)
+        for combination in combinations:
+            matched |= (flags & np.uint64(combination)) == combination
+        tier_bits |= matched.astype(np.uint16) << np.uint16(tier)
+    return BOOST_LUT[tier_bits]
+
+
+# Flattened tier table for the compiled kernel: one row per (tier, combination)
+_TIER_MASKS = np.array(
+    [combination for _, combinations in BOOST_TIERS for combination in combinations],
+    dtype=np.uint64
+)
+_TIER_VALUES = np.array(
+    [value for value, combinations in BOOST_TIERS for _ in combinations],
+    dtype=np.float32
+)
+
+
+def _boost_similarities_numpy(similarities, flags, masks, values):
+    return np.minimum(1.0, similarities + boosts_for_flags(flags))
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _boost_similarities_kernel(similarities, flags, masks, values):
+        out = similarities.copy()
+        for i in range(similarities.shape[0]):
+            boost = 0.0
+            # First matching (tier, combination) row wins, same as the LUT priority order
+            for j in range(masks.shape[0]):
+                if (flags[i] & masks[j]) == masks[j]:
+                    boost = values[j]
+                    break
+            out[i] = min(1.0, similarities[i] + boost)
+        return out
+else:
+    _boost_similarities_kernel = _boost_similarities_numpy
+
+
+def boost_similarities(similarities: np.ndarray, flags: np.ndarray) -> np.ndarray:
+    """Add the capped keyword boost to the candidates' similarities."""
+    return _boost_similarities_kernel(
+        np.asarray(similarities, dtype=np.float32),
+        np.asarray(flags, dtype=np.uint64),
+        _TIER_MASKS,
+        _TIER_VALUES
+    )
+
+
+# Spec-query sort priority rules in order - the first rule whose flags are all set wins
+SCREEN_TO_BODY_PRIORITY_RULES = (
+    # Explicit Screen-to-Body Ratio mentions go to the top
+    (FLAG_SCREEN_TO_BODY, 1000),
+    # Display chunks with percentage
+    (FLAG_DISPLAY_OR_SCREEN | FLAG_PERCENT, 500),
+)
+PRIORITY_RULES = (
+    (FLAG_PERFORMANCE | FLAG_SUBSTANTIAL, 1000),
+    # Processor chunks with model info
+    (FLAG_PROCESSOR_WORD | FLAG_PROCESSOR_DETAIL, 950),
+    (FLAG_BATTERY_OR_AKKU | FLAG_BATTERY_SPEC_UNIT, 900),
+    (FLAG_WEIGHT_WORD | FLAG_WEIGHT_SPEC_UNIT, 850),
+    (FLAG_DIMENSIONS_WORD | FLAG_DIMENSIONS_SPEC_UNIT, 800),
+    # Display chunks with brightness/nits
+    (FLAG_DISPLAY_OR_SCREEN | FLAG_BRIGHTNESS_WORD, 850),
+    (FLAG_DISPLAY_OR_SCREEN | FLAG_DISPLAY_SIZE_WORD, 750),
+    # Core specs
+    (FLAG_CORE_SPEC, 700),
+)
+
+
+def _build_priority_lut(rules) -> np.ndarray:
+    """Map every combination of matched rules to the priority of its first matching rule."""
+    lut = np.zeros(1 << len(rules), dtype=np.int64)
+    masks = np.arange(lut.size)
+    # Fill from the last rule up so earlier rules overwrite
+    for index in reversed(range(len(rules))):
+        lut[(masks & (1 << index)) != 0] = rules[index][1]
+    return lut
+
+
+_PRIORITY_TABLES = {
+    False: (PRIORITY_RULES, _build_priority_lut(PRIORITY_RULES)),
+    True: (
+        SCREEN_TO_BODY_PRIORITY_RULES + PRIORITY_RULES,
+        _build_priority_lut(SCREEN_TO_BODY_PRIORITY_RULES + PRIORITY_RULES)
+    ),
+}
+
+
+def sort_priorities(flags: np.ndarray, screen_to_body_query: bool) -> np.ndarray:
+    """Spec-query sort priority per chunk, looked up from the matched priority rules."""
+    flags = np.asarray(flags, dtype=np.uint64)
+    rules, lut = _PRIORITY_TABLES[bool(screen_to_body_query)]
+    rule_bits = np.zeros(flags.shape, dtype=np.intp)
+    for index, (mask, _) in enumerate(rules):
+        rule_bits |= ((flags & np.uint64(mask)) == np.uint64(mask)).astype(np.intp) << index
+    return lut[rule_bits]
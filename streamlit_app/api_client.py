@@ -0,0 +1,88 @@
+"""HTTP client for the backend API, shared by all Streamlit pages."""
+import json
+from typing import Any, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_BASE_URL = "http://localhost:8000"
+
+CONNECTION_ERROR_MESSAGE = "Verbindungsfehler: Backend nicht erreichbar. Bitte starten Sie das Backend mit './run_backend.sh'"
+TIMEOUT_MESSAGE = "Zeitüberschreitung: Das Backend antwortet nicht."
+INVALID_RESPONSE_MESSAGE = "Ungültige Antwort vom Backend. Bitte überprüfen Sie die Backend-Logs."
+
+# One session per process (this module is imported once, not on every rerun), so all pages
+# and the upload threads reuse keep-alive connections.
+# Retries only apply to idempotent requests (GET/HEAD), not to POSTs
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=Retry(total=2, backoff_factor=0.1))
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+
+def parse_json(content: bytes):
+    """Decode a JSON response body (with orjson if installed)."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def parse_error(response: requests.Response, limit: int = 200) -> str:
+    """Error message of a failed API response."""
+    # Only JSON bodies are parsed; HTML error pages (proxy, crash) go straight to the text
+    if "json" in response.headers.get("content-type", ""):
+        try:
+            return parse_json(response.content).get('detail', f'HTTP {response.status_code}')
+        except (ValueError, AttributeError):
+            pass
+    return f"HTTP {response.status_code}: {response.text[:limit]}"
+
+
+def request(method: str, path: str, **kwargs) -> requests.Response:
+    """Send a request to the API and return the raw response (for streams and status checks)."""
+    return session.request(method, f"{API_BASE_URL}{path}", **kwargs)
+
+
+def _call(method: str, path: str, **kwargs) -> Tuple[bool, Any]:
+    """
+    Send a request to the API.
+    Returns (True, decoded JSON or raw body) on a 2xx response, otherwise (False, error message).
+    """
+    try:
+        response = request(method, path, **kwargs)
+    except requests.exceptions.ConnectionError:
+        return False, CONNECTION_ERROR_MESSAGE
+    except requests.exceptions.Timeout:
+        return False, TIMEOUT_MESSAGE
+    except requests.exceptions.RequestException as e:
+        return False, str(e)
+
+    if not response.ok:
+        return False, parse_error(response)
+    if "json" not in response.headers.get("content-type", ""):
+        return True, response.content
+    try:
+        return True, parse_json(response.content)
+    except ValueError:
+        return False, INVALID_RESPONSE_MESSAGE
+
+
+def api_get(path: str, **kwargs) -> Tuple[bool, Any]:
+    """GET an API path; see _call for the result."""
+    return _call("GET", path, **kwargs)
+
+
+def api_post(path: str, **kwargs) -> Tuple[bool, Any]:
+    """POST to an API path; see _call for the result."""
+    return _call("POST", path, **kwargs)
+
+
+def api_delete(path: str, **kwargs) -> Tuple[bool, Any]:
+    """DELETE an API path; see _call for the result."""
+    return _call("DELETE", path, **kwargs)
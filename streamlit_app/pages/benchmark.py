@@ -1,16 +1,11 @@
 """Benchmark page for RAGAS evaluation."""
 import streamlit as st
-import requests
-import sys
-from pathlib import Path
+import pandas as pd
 
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from streamlit_app.api_client import api_post
 
-API_BASE_URL = "http://localhost:8000"
-
-def get_headers():
-    """Get headers (no authentication needed)."""
-    return {}
+# Separates several contexts within one table cell
+CONTEXT_SEPARATOR = "||"
 
 def show_benchmark():
     """Show benchmark page."""
@@ -18,122 +13,71 @@ def show_benchmark():
     st.markdown("Evaluieren Sie Ihre RAG-Pipeline mit RAGAS-Metriken")
     
     # Initialize session state
-    if "benchmark_questions" not in st.session_state:
-        st.session_state.benchmark_questions = [""]
-        st.session_state.benchmark_answers = [""]
-        st.session_state.benchmark_contexts = [[""]]
-        st.session_state.benchmark_ground_truths = [""]
+    if "benchmark_df" not in st.session_state:
+        st.session_state.benchmark_df = pd.DataFrame(
+            {"Frage": [""], "Antwort": [""], "Kontexte": [""], "Ground Truth": [""]}
+        )
     
-    # Question input
+    # Question input - one editable table (one row per question) instead of widgets per field
     st.subheader("Benchmark-Daten eingeben")
     
-    num_questions = st.number_input(
-        "Anzahl der Fragen",
-        min_value=1,
-        max_value=10,
-        value=len(st.session_state.benchmark_questions),
-        step=1
-    )
-    
-    # Adjust lists to match num_questions
-    while len(st.session_state.benchmark_questions) < num_questions:
-        st.session_state.benchmark_questions.append("")
-        st.session_state.benchmark_answers.append("")
-        st.session_state.benchmark_contexts.append([""])
-        st.session_state.benchmark_ground_truths.append("")
-    
-    while len(st.session_state.benchmark_questions) > num_questions:
-        st.session_state.benchmark_questions.pop()
-        st.session_state.benchmark_answers.pop()
-        st.session_state.benchmark_contexts.pop()
-        st.session_state.benchmark_ground_truths.pop()
-    
-    # Input forms
-    for i in range(num_questions):
-        with st.expander(f"Frage {i+1}", expanded=i==0):
-            st.session_state.benchmark_questions[i] = st.text_input(
-                "Frage",
-                value=st.session_state.benchmark_questions[i],
-                key=f"question_{i}"
-            )
-            
-            st.session_state.benchmark_answers[i] = st.text_area(
-                "Antwort",
-                value=st.session_state.benchmark_answers[i],
-                key=f"answer_{i}",
-                height=100
-            )
-            
-            # Contexts
-            st.write("Kontexte:")
-            num_contexts = st.number_input(
-                "Anzahl Kontexte",
-                min_value=1,
-                max_value=5,
-                value=len(st.session_state.benchmark_contexts[i]),
-                key=f"num_contexts_{i}"
-            )
-            
-            # Adjust contexts list
-            while len(st.session_state.benchmark_contexts[i]) < num_contexts:
-                st.session_state.benchmark_contexts[i].append("")
-            while len(st.session_state.benchmark_contexts[i]) > num_contexts:
-                st.session_state.benchmark_contexts[i].pop()
-            
-            for j in range(num_contexts):
-                st.session_state.benchmark_contexts[i][j] = st.text_area(
-                    f"Kontext {j+1}",
-                    value=st.session_state.benchmark_contexts[i][j],
-                    key=f"context_{i}_{j}",
-                    height=80
-                )
-            
-            st.session_state.benchmark_ground_truths[i] = st.text_area(
+    edited_df = st.data_editor(
+        st.session_state.benchmark_df,
+        key="benchmark_editor",
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "Frage": st.column_config.TextColumn("Frage", required=True),
+            "Antwort": st.column_config.TextColumn("Antwort"),
+            "Kontexte": st.column_config.TextColumn(
+                "Kontexte",
+                help=f"Mehrere Kontexte mit \"{CONTEXT_SEPARATOR}\" trennen"
+            ),
+            "Ground Truth": st.column_config.TextColumn(
                 "Ground Truth (optional)",
-                value=st.session_state.benchmark_ground_truths[i],
-                key=f"ground_truth_{i}",
-                height=80,
                 help="Die erwartete Antwort (optional)"
-            )
+            ),
+        }
+    )
     
     # Run benchmark button
     if st.button("Benchmark ausführen", use_container_width=True, type="primary"):
         # Filter empty entries
-        questions = [q for q in st.session_state.benchmark_questions if q.strip()]
-        answers = [a for a in st.session_state.benchmark_answers if a.strip()]
-        contexts = [
-            [c for c in ctx if c.strip()]
-            for ctx in st.session_state.benchmark_contexts
-            if any(c.strip() for c in ctx)
+        rows = edited_df.fillna("").astype(str).to_dict("records")
+        rows = [row for row in rows if row["Frage"].strip()]
+        questions = [row["Frage"] for row in rows]
+        answers = [row["Antwort"] for row in rows if row["Antwort"].strip()]
+        row_contexts = [
+            [c.strip() for c in row["Kontexte"].split(CONTEXT_SEPARATOR) if c.strip()]
+            for row in rows
         ]
+        contexts = [ctx for ctx in row_contexts if ctx]
         ground_truths = [
-            gt for gt in st.session_state.benchmark_ground_truths
-            if gt.strip()
+            row["Ground Truth"] for row in rows
+            if row["Ground Truth"].strip()
         ] or None
         
-        if len(questions) != len(answers) or len(questions) != len(contexts):
+        if not questions or len(questions) != len(answers) or len(questions) != len(contexts):
             st.error("Bitte füllen Sie alle Felder aus (Frage, Antwort, Kontexte)")
         else:
             with st.spinner("Benchmark wird ausgeführt..."):
                 try:
-                    response = requests.post(
-                        f"{API_BASE_URL}/api/benchmark/run",
+                    ok, results = api_post(
+                        "/api/benchmark/run",
                         json={
                             "questions": questions,
                             "answers": answers,
                             "contexts": contexts,
                             "ground_truths": ground_truths
-                        },
-                        headers=get_headers()
+                        }
                     )
                     
-                    if response.status_code == 200:
-                        results = response.json()
+                    if ok:
                         st.session_state.benchmark_results = results
                         st.success("Benchmark erfolgreich ausgeführt!")
                         st.rerun()
                     else:
-                        st.error(f"Fehler: {response.json().get('detail', 'Unbekannter Fehler')}")
+                        st.error(f"Fehler: {results}")
                 except Exception as e:
                     st.error(f"Fehler: {str(e)}")
     
@@ -174,7 +118,6 @@ def show_benchmark():
         
         # Detailed results
         with st.expander("Detaillierte Ergebnisse"):
-            import pandas as pd
             df = pd.DataFrame(results.get("results", []))
             st.dataframe(df)
         
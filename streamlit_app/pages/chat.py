@@ -1,36 +1,114 @@
 """Chat page for RAG queries."""
 import streamlit as st
-import requests
-import sys
-from pathlib import Path
-import pandas as pd
-from datetime import datetime
+import hashlib
+import json
+from collections import OrderedDict
 import time
 
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from streamlit_app.api_client import api_get, request, parse_error, parse_json
 
-API_BASE_URL = "http://localhost:8000"
+# Number of answers kept for repeated questions, and for how many seconds
+ANSWER_CACHE_SIZE = 128
+ANSWER_CACHE_TTL = 300
 
-def get_headers():
-    """Get headers (no authentication needed)."""
-    return {}
+# Longer chat history messages are sent as head + tail only
+CHAT_HISTORY_MAX_CHARS = 4000
+CHAT_HISTORY_HEAD_CHARS = 2000
+CHAT_HISTORY_TAIL_CHARS = 1000
 
+@st.cache_resource
+def get_answer_cache() -> "OrderedDict[str, tuple]":
+    """
+    LRU of recent (timestamp, /api/query response), shared across reruns and sessions.
+    The dashboard clears it whenever documents are indexed or deleted.
+    """
+    return OrderedDict()
+
+def answer_cache_key(prompt: str, previous_messages: list) -> str:
+    """Cache key of a question: the normalized prompt and the conversation before it."""
+    payload = json.dumps([prompt.strip().lower(), previous_messages], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_documents():
+    """Document list for the sidebar, reused across reruns for a few seconds (None if the API returns an error)."""
+    ok, documents = api_get("/api/documents", timeout=5)
+    return documents if ok else None
+
+@st.cache_data(ttl=30, show_spinner=False)
 def get_query_statistics():
-    """Get query statistics from API."""
-    try:
-        response = requests.get(
-            f"{API_BASE_URL}/api/query/history",
-            headers=get_headers(),
-            params={"limit": 1000},  # Get more history for statistics
-            timeout=10
+    """
+    Aggregated query statistics from the API history, reused across reruns for a few seconds.
+    Returns total count, sum and count of response times, and the last 50 response times.
+    """
+    statistics = {"total_queries": 0, "time_sum": 0.0, "time_count": 0, "recent_times": []}
+    ok, history = api_get(
+        "/api/query/history",
+        params={"limit": 1000},  # Get more history for statistics
+        timeout=10
+    )
+    if not ok:
+        # Don't show error in sidebar, just return empty statistics
+        return statistics
+    
+    # Extract response times from history metadata
+    response_times = []
+    for item in history:
+        metadata = item.get("query_metadata", {})
+        if metadata:
+            total_time = metadata.get("total_time", 0.0)
+            if total_time > 0:
+                response_times.append(total_time)
+    
+    statistics["total_queries"] = len(history)
+    statistics["time_sum"] = sum(response_times)
+    statistics["time_count"] = len(response_times)
+    statistics["recent_times"] = response_times[-50:]
+    return statistics
+
+@st.cache_data(ttl=60, show_spinner=False)
+def response_time_chart_data(times: tuple):
+    """DataFrame for the response time graph, rebuilt only when the times change."""
+    import pandas as pd  # Deferred: reruns without a graph don't load pandas
+    df = pd.DataFrame({
+        'Anfrage': range(1, len(times) + 1),
+        'Antwortzeit (s)': times
+    })
+    return df.set_index('Anfrage')
+
+def show_sources(sources: list, key_prefix: str):
+    """Render the sources of an answer: one metadata table, then the chunk texts."""
+    import pandas as pd  # Only needed once an answer with sources is shown
+    
+    with st.expander("📚 Quellen anzeigen", expanded=False):
+        # Use original source number if available, otherwise use index
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Quelle": source.get('source_number', i),
+                    "Seite": source.get('page_number'),
+                    "Dokument ID": source.get('document_id'),
+                    "Chunk ID": source.get('chunk_id', 'N/A')
+                }
+                for i, source in enumerate(sources, 1)
+            ]),
+            hide_index=True,
+            use_container_width=True
         )
-        if response.status_code == 200:
-            history = response.json()
-            return history
-        return []
-    except Exception as e:
-        # Don't show error in sidebar, just return empty list
-        return []
+        
+        # Display chunk texts where available
+        for i, source in enumerate(sources, 1):
+            if source.get('text'):
+                source_num = source.get('source_number', i)
+                st.markdown(f"**Quelle {source_num} - Text-Ausschnitt:**")
+                st.text_area(
+                    label=f"Text aus Quelle {source_num}",
+                    value=source.get('text'),
+                    height=300,  # Increased height for better table visibility
+                    disabled=True,
+                    label_visibility="collapsed",
+                    key=f"{key_prefix}_{i}"
+                )
 
 def show_chat():
     """Show chat page."""
@@ -60,14 +138,9 @@ def show_chat():
     with st.sidebar:
         st.subheader("Informationen")
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/api/documents",
-                headers=get_headers(),
-                timeout=30
-            )
+            documents = fetch_documents()
             
-            if response.status_code == 200:
-                documents = response.json()
+            if documents is not None:
                 indexed_docs = [doc for doc in documents if doc['status'] == 'indexed']
                 
                 if indexed_docs:
@@ -84,41 +157,27 @@ def show_chat():
         # Statistics section
         st.subheader("📊 Statistiken")
         
-        # Get query history for total count and response times
-        history = get_query_statistics()
-        total_queries = len(history)
-        
-        # Extract response times from history metadata
-        response_times_from_db = []
-        for item in history:
-            metadata = item.get("query_metadata", {})
-            if metadata:
-                total_time = metadata.get("total_time", 0.0)
-                if total_time > 0:
-                    response_times_from_db.append(total_time)
+        # Get query history statistics for total count and response times
+        statistics = get_query_statistics()
+        total_queries = statistics["total_queries"]
         
         # Combine with session state times (for current session)
         query_times = st.session_state.get("query_times", [])
-        all_times = response_times_from_db + query_times
+        time_count = statistics["time_count"] + len(query_times)
         
         # Display total queries
         st.metric("Gesamt gestellte Anfragen", total_queries)
         
         # Calculate and display average response time
-        if all_times:
-            avg_time = sum(all_times) / len(all_times)
+        if time_count:
+            avg_time = (statistics["time_sum"] + sum(query_times)) / time_count
             st.metric("Durchschnittliche Antwortzeit", f"{avg_time:.2f}s")
             
             # Show response time graph (use last 50 for better visualization)
-            if len(all_times) > 1:
+            if time_count > 1:
                 st.subheader("📈 Antwortzeit-Entwicklung")
-                # Create DataFrame for the graph
-                times_to_show = all_times[-50:] if len(all_times) > 50 else all_times
-                df = pd.DataFrame({
-                    'Anfrage': range(1, len(times_to_show) + 1),
-                    'Antwortzeit (s)': times_to_show
-                })
-                st.line_chart(df.set_index('Anfrage'))
+                times_to_show = tuple((statistics["recent_times"] + query_times)[-50:])
+                st.line_chart(response_time_chart_data(times_to_show))
         else:
             st.info("Noch keine Statistiken verfügbar")
         
@@ -134,49 +193,12 @@ def show_chat():
             st.rerun()
     
     # Display chat messages
-    for message in st.session_state.messages:
+    for message_idx, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             if "sources" in message and message["sources"]:
-                with st.expander("📚 Quellen anzeigen", expanded=False):
-                    for i, source in enumerate(message["sources"], 1):
-                        with st.container():
-                            # Use original source number if available, otherwise use index
-                            source_num = source.get('source_number', i)
-                            st.markdown(f"### Quelle {source_num}")
-                            
-                            # Source metadata
-                            if source.get('page_number'):
-                                st.caption(f"📄 Seite {source.get('page_number')}")
-                            if source.get('document_id'):
-                                st.caption(f"📑 Dokument ID: {source.get('document_id')}")
-                            
-                            # Display chunk text if available
-                            if source.get('text'):
-                                st.markdown("**Text-Ausschnitt:**")
-                                # Create unique key using chunk_id, message index, source index, and source number
-                                # Use hash of message content + chunk_id + indices to ensure uniqueness
-                                message_idx = st.session_state.messages.index(message)
-                                source_num = source.get('source_number', i)
-                                chunk_id = source.get('chunk_id', f'idx_{i}')
-                                # Create a hash-based unique identifier
-                                import hashlib
-                                key_string = f"{message_idx}_{chunk_id}_{i}_{source_num}_{message.get('content', '')[:20]}"
-                                key_hash = hashlib.md5(key_string.encode()).hexdigest()[:8]
-                                unique_key = f"hist_source_{key_hash}_{message_idx}_{i}"
-                                st.text_area(
-                                    label=f"Text aus Quelle {source_num}",
-                                    value=source.get('text'),
-                                    height=300,  # Increased height for better table visibility
-                                    disabled=True,
-                                    label_visibility="collapsed",
-                                    key=unique_key
-                                )
-                            else:
-                                st.caption(f"Chunk ID: {source.get('chunk_id', 'N/A')}")
-                            
-                            if i < len(message["sources"]):
-                                st.divider()
+                # Message index and source index are unique per rerun and stable across reruns
+                show_sources(message["sources"], key_prefix=f"hist_source_{message_idx}")
     
     # Chat input
     if prompt := st.chat_input("Stellen Sie eine Frage..."):
@@ -192,79 +214,92 @@ def show_chat():
                 try:
                     # Prepare chat history (last 10 messages for context)
                     chat_history = []
+                    # Only role and content are sent (no sources), long answers shortened to head + tail
                     for msg in st.session_state.messages[-10:]:
+                        content = msg["content"]
+                        if len(content) > CHAT_HISTORY_MAX_CHARS:
+                            content = content[:CHAT_HISTORY_HEAD_CHARS] + " … " + content[-CHAT_HISTORY_TAIL_CHARS:]
                         chat_history.append({
                             "role": msg["role"],
-                            "content": msg["content"]
+                            "content": content
                         })
                     
-                    response = requests.post(
-                        f"{API_BASE_URL}/api/query",
-                        json={
-                            "query": prompt,
-                            "use_reranking": True,
-                            "chat_history": chat_history
-                        },
-                        headers=get_headers()
-                    )
+                    # Repeated questions with the same preceding conversation reuse the earlier answer
+                    answer_cache = get_answer_cache()
+                    cache_key = answer_cache_key(prompt, chat_history[:-1])
+                    data = None
+                    cached = answer_cache.get(cache_key)
+                    if cached is not None and time.time() - cached[0] < ANSWER_CACHE_TTL:
+                        data = cached[1]
+                    streamed = False
+                    error_msg = None
+                    if data is not None:
+                        try:
+                            answer_cache.move_to_end(cache_key)
+                        except KeyError:
+                            pass  # Evicted by another session in the meantime
+                    else:
+                        # The answer is rendered while it is generated; sources and times arrive in the last event
+                        with request(
+                            "POST",
+                            "/api/query/stream",
+                            json={
+                                "query": prompt,
+                                "use_reranking": True,
+                                "chat_history": chat_history
+                            },
+                            stream=True
+                        ) as response:
+                            if response.status_code == 200:
+                                final_event = {}
+                                
+                                def answer_deltas():
+                                    for line in response.iter_lines():
+                                        if not line.startswith(b"data:"):
+                                            continue
+                                        event = parse_json(line[5:])
+                                        if "delta" in event:
+                                            yield event["delta"]
+                                        else:
+                                            final_event.update(event)
+                                
+                                streamed_answer = st.write_stream(answer_deltas())
+                                streamed = True
+                                data = {
+                                    "answer": streamed_answer if isinstance(streamed_answer, str) else "",
+                                    **final_event
+                                }
+                                # Only complete responses are reused, never error answers
+                                if "sources" in final_event and not final_event.get("error"):
+                                    answer_cache[cache_key] = (time.time(), data)
+                                    while len(answer_cache) > ANSWER_CACHE_SIZE:
+                                        answer_cache.popitem(last=False)
+                            else:
+                                error_msg = parse_error(response)
                     
-                    if response.status_code == 200:
-                        data = response.json()
+                    if data is not None:
                         answer = data.get("answer", "")
                         sources = data.get("sources", [])
                         retrieval_time = data.get("retrieval_time", 0.0)
                         generation_time = data.get("generation_time", 0.0)
                         total_time = retrieval_time + generation_time
                         
-                        # Track response time for statistics
-                        st.session_state.query_times.append(total_time)
-                        st.session_state.query_timestamps.append(time.time())
+                        # Track response time for statistics (cached answers made no request)
+                        if streamed:
+                            st.session_state.query_times.append(total_time)
+                            st.session_state.query_timestamps.append(time.time())
                         
                         if answer and answer.strip():
-                            st.markdown(answer)
+                            # Streamed answers are already on screen
+                            if not streamed:
+                                st.markdown(answer)
                         else:
                             st.warning("Die Antwort ist leer. Bitte versuchen Sie es mit einer anderen Formulierung.")
                             answer = "Keine Antwort generiert."
                         
                         if sources:
-                            with st.expander("📚 Quellen anzeigen", expanded=False):
-                                for i, source in enumerate(sources, 1):
-                                    with st.container():
-                                        # Use original source number if available, otherwise use index
-                                        source_num = source.get('source_number', i)
-                                        st.markdown(f"### Quelle {source_num}")
-                                        
-                                        # Source metadata
-                                        if source.get('page_number'):
-                                            st.caption(f"📄 Seite {source.get('page_number')}")
-                                        if source.get('document_id'):
-                                            st.caption(f"📑 Dokument ID: {source.get('document_id')}")
-                                        
-                                        # Display chunk text if available
-                                        if source.get('text'):
-                                            st.markdown("**Text-Ausschnitt:**")
-                                            # Create unique key using chunk_id, timestamp, and source index
-                                            import hashlib
-                                            chunk_id = source.get('chunk_id', f'idx_{i}')
-                                            source_num = source.get('source_number', i)
-                                            timestamp = int(time.time() * 1000)
-                                            # Create a hash-based unique identifier
-                                            key_string = f"{chunk_id}_{i}_{source_num}_{timestamp}_{answer[:20]}"
-                                            key_hash = hashlib.md5(key_string.encode()).hexdigest()[:8]
-                                            unique_key = f"source_{key_hash}_{i}_{timestamp}"
-                                            st.text_area(
-                                                label=f"Text aus Quelle {source_num}",
-                                                value=source.get('text'),
-                                                height=300,  # Increased height for better table visibility
-                                                disabled=True,
-                                                label_visibility="collapsed",
-                                                key=unique_key
-                                            )
-                                        else:
-                                            st.caption(f"Chunk ID: {source.get('chunk_id', 'N/A')}")
-                                        
-                                        if i < len(sources):
-                                            st.divider()
+                            # The new message gets the next message index (stored below)
+                            show_sources(sources, key_prefix=f"source_{len(st.session_state.messages)}")
                         else:
                             st.info("Keine Quellen verfügbar.")
                         
@@ -275,7 +310,6 @@ def show_chat():
                             "sources": sources
                         })
                     else:
-                        error_msg = response.json().get('detail', 'Unbekannter Fehler')
                         st.error(f"Fehler: {error_msg}")
                 except Exception as e:
                     st.error(f"Fehler: {str(e)}")
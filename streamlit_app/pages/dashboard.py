@@ -1,16 +1,51 @@
 """Dashboard page for document management."""
 import streamlit as st
+import gzip
+import io
+import pandas as pd
 import requests
-import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from streamlit_app.api_client import api_get, api_post, request, parse_error
+from streamlit_app.pages.chat import get_answer_cache
 
-API_BASE_URL = "http://localhost:8000"
+try:
+    import fitz  # PyMuPDF
+    from PIL import Image
+except ImportError:
+    fitz = None
 
-def get_headers():
-    """Get headers (no authentication needed)."""
-    return {}
+# Maximum number of upload requests sent at the same time
+UPLOAD_WORKERS = 6
+# Files per upload request
+UPLOAD_BATCH_SIZE = 10
+# Minimum seconds between upload progress updates
+PROGRESS_UPDATE_INTERVAL = 0.25
+# Text formats sent gzip-compressed (PDF, DOCX and XLSX are already compressed)
+COMPRESSED_UPLOAD_SUFFIXES = (".txt", ".md", ".csv", ".html", ".json")
+
+# PDF preview rendering: zoom factor (1.0 = 72 DPI) and JPEG quality
+PREVIEW_ZOOM = 1.5
+PREVIEW_JPEG_QUALITY = 80
+
+# Polling of background ingest tasks: first interval and upper bound (seconds)
+INGEST_POLL_INTERVAL = 2
+INGEST_POLL_MAX_INTERVAL = 10
+
+# Units of format_file_size, each 1024 times the previous one
+FILE_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_documents():
+    """(ok, document list or error message), reused across reruns for a few seconds."""
+    return api_get("/api/documents", timeout=10)
+
+def invalidate_index_caches():
+    """Drop cached document lists and chat answers after documents were indexed or deleted."""
+    fetch_documents.clear()
+    get_answer_cache().clear()
 
 def show_dashboard():
     """Show dashboard page."""
@@ -38,7 +73,7 @@ def show_dashboard():
         # Show selected files
         st.write(f"**{len(uploaded_files)} Datei(en) ausgewählt:**")
         for file in uploaded_files:
-            file_size_mb = len(file.getvalue()) / (1024 * 1024)
+            file_size_mb = file.size / (1024 * 1024)
             st.write(f"- {file.name} ({file_size_mb:.2f} MB)")
         
         if st.button("Alle hochladen", use_container_width=True, type="primary"):
@@ -49,39 +84,30 @@ def show_dashboard():
             error_count = 0
             errors = []
             
-            for idx, uploaded_file in enumerate(uploaded_files):
-                try:
-                    status_text.text(f"Hochladen: {uploaded_file.name} ({idx + 1}/{len(uploaded_files)})...")
-                    
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                    response = requests.post(
-                        f"{API_BASE_URL}/api/documents/upload",
-                        files=files,
-                        headers=get_headers(),
-                        timeout=60
-                    )
-                    
-                    if response.status_code == 201:
-                        success_count += 1
-                    else:
-                        error_count += 1
-                        try:
-                            error_detail = response.json().get('detail', f'HTTP {response.status_code}')
-                        except (ValueError, requests.exceptions.JSONDecodeError):
-                            error_detail = f"HTTP {response.status_code}: {response.text[:100]}"
-                        errors.append(f"{uploaded_file.name}: {error_detail}")
-                    
-                    upload_progress.progress((idx + 1) / len(uploaded_files))
+            # Files are sent in batches (one request each), several batches at once;
+            # the UI is only updated from this thread
+            status_text.text(f"Hochladen: {len(uploaded_files)} Datei(en)...")
+            batches = [
+                uploaded_files[start:start + UPLOAD_BATCH_SIZE]
+                for start in range(0, len(uploaded_files), UPLOAD_BATCH_SIZE)
+            ]
+            done_count = 0
+            last_update = 0.0
+            with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(batches))) as executor:
+                futures = [executor.submit(upload_batch, batch) for batch in batches]
+                for future in as_completed(futures):
+                    batch_size, batch_success, batch_errors = future.result()
+                    success_count += batch_success
+                    error_count += len(batch_errors)
+                    errors.extend(batch_errors)
                     
-                except requests.exceptions.ConnectionError:
-                    error_count += 1
-                    errors.append(f"{uploaded_file.name}: Backend nicht erreichbar")
-                except requests.exceptions.Timeout:
-                    error_count += 1
-                    errors.append(f"{uploaded_file.name}: Zeitüberschreitung")
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"{uploaded_file.name}: {str(e)}")
+                    done_count += batch_size
+                    # Each update is a message to the browser, so they are sent at most every few hundred ms
+                    now = time.monotonic()
+                    if now - last_update >= PROGRESS_UPDATE_INTERVAL or done_count == len(uploaded_files):
+                        status_text.text(f"Hochgeladen: {done_count}/{len(uploaded_files)} Datei(en)")
+                        upload_progress.progress(done_count / len(uploaded_files))
+                        last_update = now
             
             # Show results
             upload_progress.empty()
@@ -96,6 +122,7 @@ def show_dashboard():
                     st.error(f"  - {error}")
             
             if success_count > 0:
+                fetch_documents.clear()
                 st.rerun()
     
     st.divider()
@@ -104,71 +131,64 @@ def show_dashboard():
     st.subheader("Meine Dokumente")
     
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/api/documents",
-            headers=get_headers(),
-            timeout=10
-        )
+        ok, documents = fetch_documents()
         
-        if response.status_code == 200:
-            try:
-                documents = response.json()
-            except (ValueError, requests.exceptions.JSONDecodeError):
-                st.error("Ungültige Antwort vom Backend. Bitte überprüfen Sie die Backend-Logs.")
-                return
-            
+        if ok:
             if len(documents) == 0:
                 st.info("Noch keine Dokumente hochgeladen")
             else:
-                # Count non-indexed documents
-                non_indexed = [doc for doc in documents if doc['status'] != 'indexed']
-                indexed = [doc for doc in documents if doc['status'] == 'indexed']
+                # Count indexed and non-indexed documents in one pass
+                indexed_count = sum(1 for doc in documents if doc['status'] == 'indexed')
+                non_indexed_count = len(documents) - indexed_count
                 
                 # Show summary and bulk ingest button
                 col1, col2 = st.columns([2, 1])
                 with col1:
                     st.write(f"**Gesamt:** {len(documents)} Dokument(e) | "
-                            f"✅ Indiziert: {len(indexed)} | "
-                            f"⏳ Nicht indiziert: {len(non_indexed)}")
+                            f"✅ Indiziert: {indexed_count} | "
+                            f"⏳ Nicht indiziert: {non_indexed_count}")
                 with col2:
-                    if len(non_indexed) > 0:
+                    if non_indexed_count > 0:
                         if st.button("🔄 Alle indizieren", use_container_width=True, type="primary"):
                             ingest_all_documents()
                 
-                if len(non_indexed) > 0:
+                if non_indexed_count > 0:
                     st.divider()
                 
-                for doc in documents:
-                    with st.container():
-                        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
-                        
-                        with col1:
-                            st.write(f"**{doc['filename']}**")
-                            st.caption(f"{doc['file_type'].upper()} • {format_file_size(doc['file_size'])} • {doc['status']}")
-                        
-                        with col2:
-                            if doc['status'] != 'indexed':
-                                if st.button("Indizieren", key=f"ingest_{doc['id']}", use_container_width=True):
-                                    ingest_document(doc['id'])
-                        with col3:
-                            if st.button("Vorschau", key=f"preview_{doc['id']}", use_container_width=True):
-                                st.session_state.preview_doc_id = doc['id']
-                                st.rerun()
-                        with col4:
-                            if st.button("Löschen", key=f"delete_{doc['id']}", use_container_width=True):
-                                delete_document(doc['id'])
-                        
-                        st.divider()
+                # One table with row selection instead of four buttons per document
+                table = pd.DataFrame([
+                    {
+                        "Datei": doc['filename'],
+                        "Typ": doc['file_type'].upper(),
+                        "Größe": format_file_size(doc['file_size']),
+                        "Status": doc['status']
+                    }
+                    for doc in documents
+                ])
+                selection = st.dataframe(
+                    table,
+                    key="documents_table",
+                    on_select="rerun",
+                    selection_mode="multi-row",
+                    hide_index=True,
+                    use_container_width=True
+                )
+                selected = [documents[row] for row in selection.selection.rows if row < len(documents)]
+                selected_non_indexed = [doc['id'] for doc in selected if doc['status'] != 'indexed']
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    if st.button("Indizieren", use_container_width=True, disabled=not selected_non_indexed):
+                        ingest_documents(selected_non_indexed)
+                with col2:
+                    if st.button("Vorschau", use_container_width=True, disabled=len(selected) != 1):
+                        st.session_state.preview_doc_id = selected[0]['id']
+                        st.rerun()
+                with col3:
+                    if st.button("Löschen", use_container_width=True, disabled=not selected):
+                        delete_documents([doc['id'] for doc in selected])
         else:
-            try:
-                error_detail = response.json().get('detail', f'HTTP {response.status_code}')
-            except (ValueError, requests.exceptions.JSONDecodeError):
-                error_detail = f"HTTP {response.status_code}: {response.text[:200]}"
-            st.error(f"Fehler beim Laden der Dokumente: {error_detail}")
-    except requests.exceptions.ConnectionError:
-        st.error("Verbindungsfehler: Backend nicht erreichbar. Bitte starten Sie das Backend mit './run_backend.sh'")
-    except requests.exceptions.Timeout:
-        st.error("Zeitüberschreitung: Das Backend antwortet nicht.")
+            st.error(f"Fehler beim Laden der Dokumente: {documents}")
     except Exception as e:
         st.error(f"Fehler: {str(e)}")
     
@@ -178,55 +198,109 @@ def show_dashboard():
         st.subheader("PDF-Vorschau")
         show_pdf_preview(st.session_state.preview_doc_id)
 
+def upload_batch(batch):
+    """Upload several files in one request; returns (number of files, successes, error messages)."""
+    try:
+        files = []
+        for uploaded_file in batch:
+            if Path(uploaded_file.name).suffix.lower() in COMPRESSED_UPLOAD_SUFFIXES:
+                # Text formats shrink a lot; the backend decompresses parts sent as application/gzip
+                content = gzip.compress(uploaded_file.getvalue(), compresslevel=3)
+                files.append(("files", (uploaded_file.name, content, "application/gzip")))
+            else:
+                # Pass the file object itself, so its buffer is not copied with getvalue()
+                uploaded_file.seek(0)
+                files.append(("files", (uploaded_file.name, uploaded_file, uploaded_file.type)))
+        ok, data = api_post("/api/documents/upload-bulk", files=files, timeout=60 * len(batch))
+        
+        if ok:
+            errors = [f"{error['filename']}: {error['error']}" for error in data.get("errors", [])]
+            return len(batch), len(data.get("success", [])), errors
+        error_detail = data
+    except Exception as e:
+        error_detail = str(e)
+    # The whole request failed, so every file of the batch failed
+    return len(batch), 0, [f"{uploaded_file.name}: {error_detail}" for uploaded_file in batch]
+
 def format_file_size(bytes_size):
     """Format file size."""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if bytes_size < 1024.0:
-            return f"{bytes_size:.1f} {unit}"
-        bytes_size /= 1024.0
-    return f"{bytes_size:.1f} TB"
+    # Unit index from the bit length (every unit is 2^10 of the previous one)
+    unit = min(max(int(bytes_size).bit_length() - 1, 0) // 10, len(FILE_SIZE_UNITS) - 1)
+    return f"{bytes_size / 1024 ** unit:.1f} {FILE_SIZE_UNITS[unit]}"
+
+def run_ingest_task(path, timeout):
+    """
+    Start a background ingest task and poll it until it is done.
+    Returns the task result; raises RuntimeError on failure and Timeout after timeout seconds.
+    """
+    ok, data = api_post(path, timeout=10)
+    if not ok:
+        raise RuntimeError(data)
+    task_id = data["task_id"]
+    
+    deadline = time.time() + timeout
+    attempt = 0
+    while True:
+        # Polls are short requests on the keep-alive session; 5xx answers are retried with the next poll
+        response = request("GET", f"/api/documents/tasks/{task_id}", timeout=10)
+        if response.status_code == 200:
+            task = response.json()
+            if task["done"]:
+                if task["error"] is not None:
+                    raise RuntimeError(task["error"])
+                return task["result"]
+        elif response.status_code < 500:
+            raise RuntimeError(parse_error(response))
+        
+        if time.time() >= deadline:
+            raise requests.exceptions.Timeout(f"Ingest task {task_id} not done after {timeout}s")
+        time.sleep(min(INGEST_POLL_INTERVAL * 1.5 ** attempt, INGEST_POLL_MAX_INTERVAL))
+        attempt += 1
 
 def ingest_document(doc_id):
-    """Ingest a document."""
+    """Ingest a document; returns None on success, otherwise the error message."""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/api/documents/{doc_id}/ingest",
-            headers=get_headers(),
-            timeout=300  # 5 minutes for large documents
-        )
-        
-        if response.status_code == 200:
-            st.success("Dokument wird indiziert...")
-            st.rerun()
-        else:
-            try:
-                error_detail = response.json().get('detail', f'HTTP {response.status_code}')
-            except (ValueError, requests.exceptions.JSONDecodeError):
-                error_detail = f"HTTP {response.status_code}: {response.text[:200]}"
-            st.error(f"Fehler: {error_detail}")
+        run_ingest_task(f"/api/documents/{doc_id}/ingest-task", timeout=300)  # 5 minutes for large documents
+        return None
     except requests.exceptions.Timeout:
-        st.error("Zeitüberschreitung: Die Indizierung dauert zu lange. Bitte versuchen Sie es später erneut.")
+        return "Zeitüberschreitung: Die Indizierung dauert zu lange. Bitte versuchen Sie es später erneut."
     except Exception as e:
-        st.error(f"Fehler: {str(e)}")
+        return str(e)
+
+def ingest_documents(doc_ids):
+    """Ingest the selected documents."""
+    errors = []
+    with st.spinner(f"Indiziere {len(doc_ids)} Dokument(e)..."):
+        for doc_id in doc_ids:
+            error = ingest_document(doc_id)
+            if error is not None:
+                errors.append(f"Dokument {doc_id}: {error}")
+    
+    if len(errors) < len(doc_ids):
+        invalidate_index_caches()
+    if errors:
+        for error in errors:
+            st.error(f"Fehler: {error}")
+    else:
+        st.rerun()
 
-def delete_document(doc_id):
-    """Delete a document."""
+def delete_documents(doc_ids):
+    """Delete the selected documents with one request."""
     try:
-        response = requests.delete(
-            f"{API_BASE_URL}/api/documents/{doc_id}",
-            headers=get_headers(),
-            timeout=10
-        )
+        ok, data = api_post("/api/documents/delete-bulk", json={"document_ids": doc_ids}, timeout=30)
         
-        if response.status_code == 204:
-            st.success("Dokument gelöscht")
-            st.rerun()
+        if ok:
+            if data.get("deleted"):
+                invalidate_index_caches()
+                if st.session_state.get("preview_doc_id") in data["deleted"]:
+                    del st.session_state.preview_doc_id
+            if data.get("errors"):
+                for error in data["errors"]:
+                    st.error(f"Fehler: Dokument {error['document_id']}: {error['error']}")
+            else:
+                st.rerun()
         else:
-            try:
-                error_detail = response.json().get('detail', f'HTTP {response.status_code}')
-            except (ValueError, requests.exceptions.JSONDecodeError):
-                error_detail = f"HTTP {response.status_code}: {response.text[:200]}"
-            st.error(f"Fehler: {error_detail}")
+            st.error(f"Fehler: {data}")
     except Exception as e:
         st.error(f"Fehler: {str(e)}")
 
@@ -234,91 +308,107 @@ def ingest_all_documents():
     """Ingest all non-indexed documents."""
     try:
         with st.spinner("Indiziere alle Dokumente..."):
-            response = requests.post(
-                f"{API_BASE_URL}/api/documents/ingest-all",
-                headers=get_headers(),
-                timeout=600  # 10 minutes for multiple documents
-            )
+            data = run_ingest_task("/api/documents/ingest-all-task", timeout=600)  # 10 minutes for multiple documents
             
-            if response.status_code == 200:
-                data = response.json()
-                success_count = data.get("success_count", 0)
-                error_count = data.get("error_count", 0)
-                
-                if success_count > 0:
-                    st.success(f"✅ {success_count} Dokument(e) erfolgreich indiziert!")
-                    if data.get("success"):
-                        with st.expander("Indizierte Dokumente anzeigen"):
-                            for item in data["success"]:
-                                st.write(f"- {item['filename']} ({item['chunks_count']} Chunks)")
-                
-                if error_count > 0:
-                    st.warning(f"⚠️ {error_count} Dokument(e) konnten nicht indiziert werden:")
-                    if data.get("errors"):
-                        for error in data["errors"]:
-                            st.error(f"  - {error['filename']}: {error['error']}")
-                
-                st.rerun()
-            else:
-                try:
-                    error_detail = response.json().get('detail', f'HTTP {response.status_code}')
-                except (ValueError, requests.exceptions.JSONDecodeError):
-                    error_detail = f"HTTP {response.status_code}: {response.text[:200]}"
-                st.error(f"Fehler: {error_detail}")
+            success_count = data.get("success_count", 0)
+            error_count = data.get("error_count", 0)
+            
+            if success_count > 0:
+                st.success(f"✅ {success_count} Dokument(e) erfolgreich indiziert!")
+                if data.get("success"):
+                    with st.expander("Indizierte Dokumente anzeigen"):
+                        for item in data["success"]:
+                            st.write(f"- {item['filename']} ({item['chunks_count']} Chunks)")
+            
+            if error_count > 0:
+                st.warning(f"⚠️ {error_count} Dokument(e) konnten nicht indiziert werden:")
+                if data.get("errors"):
+                    for error in data["errors"]:
+                        st.error(f"  - {error['filename']}: {error['error']}")
+            
+            invalidate_index_caches()
+            st.rerun()
     except requests.exceptions.Timeout:
         st.error("Zeitüberschreitung: Die Indizierung dauert zu lange. Bitte versuchen Sie es später erneut.")
     except Exception as e:
         st.error(f"Fehler: {str(e)}")
 
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def fetch_pdf(doc_id):
+    """Status code and content of a document preview, reused while its pages are browsed."""
+    with request("GET", f"/api/documents/{doc_id}/preview", stream=True) as response:
+        size = int(response.headers.get("content-length", 0))
+        # Content-Length is the encoded size for compressed bodies, so only plain bodies are pre-sized
+        if response.status_code != 200 or not size or response.headers.get("content-encoding"):
+            return response.status_code, response.content
+        # Read straight from the socket into a buffer of the final size (no growing buffer)
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = response.raw.readinto(view[received:])
+            if not count:
+                break
+            received += count
+        view.release()
+        return response.status_code, bytes(buffer[:received]) if received < size else bytes(buffer)
+
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def pdf_page_count(doc_id) -> int:
+    """Number of pages of a previewed PDF."""
+    _, content = fetch_pdf(doc_id)
+    with fitz.open(stream=content, filetype="pdf") as pdf_document:
+        return len(pdf_document)
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def render_pdf_page(doc_id, page_num) -> bytes:
+    """JPEG of a previewed PDF page, so browsing back to a page doesn't render it again."""
+    _, content = fetch_pdf(doc_id)
+    with fitz.open(stream=content, filetype="pdf") as pdf_document:
+        page = pdf_document[page_num - 1]
+        pix = page.get_pixmap(matrix=fitz.Matrix(PREVIEW_ZOOM, PREVIEW_ZOOM), alpha=False)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    # Encoded once here instead of Streamlit encoding a PNG on every display
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=PREVIEW_JPEG_QUALITY)
+    return buffer.getvalue()
+
 def show_pdf_preview(doc_id):
     """Show PDF preview."""
     try:
-        preview_url = f"{API_BASE_URL}/api/documents/{doc_id}/preview"
-        headers = get_headers()
-        
         # Get PDF content
-        response = requests.get(preview_url, headers=headers, stream=True)
+        status_code, content = fetch_pdf(doc_id)
         
-        if response.status_code == 200:
+        if status_code == 200:
             # Display PDF download button
             st.download_button(
                 "📥 PDF herunterladen",
-                response.content,
+                content,
                 file_name=f"document_{doc_id}.pdf",
                 mime="application/pdf",
                 use_container_width=True
             )
             
             # Try to show PDF preview using PyMuPDF
+            if fitz is None:
+                st.info("PyMuPDF nicht verfügbar. PDF-Vorschau nicht möglich.")
+                return
             try:
-                import fitz  # PyMuPDF
-                import io
-                from PIL import Image
-                
-                pdf_bytes = io.BytesIO(response.content)
-                pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+                page_count = pdf_page_count(doc_id)
                 
                 page_num = st.number_input(
                     "Seite",
                     min_value=1,
-                    max_value=len(pdf_document),
+                    max_value=page_count,
                     value=1,
                     key=f"page_{doc_id}"
                 )
                 
-                page = pdf_document[page_num - 1]
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                st.image(img, caption=f"Seite {page_num} von {len(pdf_document)}")
-                
-                pdf_document.close()
-            except ImportError:
-                st.info("PyMuPDF nicht verfügbar. PDF-Vorschau nicht möglich.")
+                img = render_pdf_page(doc_id, page_num)
+                st.image(img, caption=f"Seite {page_num} von {page_count}")
             except Exception as e:
                 st.warning(f"PDF-Vorschau fehlgeschlagen: {str(e)}")
         else:
             st.error("Fehler beim Laden der PDF-Vorschau")
     except Exception as e:
         st.error(f"Fehler: {str(e)}")
-
@@ -1,18 +1,22 @@
 """Login and registration page."""
 import streamlit as st
 import requests
-import sys
-from pathlib import Path
 
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from streamlit_app.api_client import (
+    api_get, api_post, request, parse_error, CONNECTION_ERROR_MESSAGE, TIMEOUT_MESSAGE
+)
 
-API_BASE_URL = "http://localhost:8000"
+@st.cache_data(ttl=30, show_spinner=False)
+def backend_health() -> bool:
+    """Health check result, reused across reruns; failures raise and are therefore not cached."""
+    response = request("HEAD", "/health", timeout=2)
+    response.raise_for_status()
+    return True
 
 def check_backend_connection():
     """Check if backend is reachable."""
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=2)
-        return response.status_code == 200
+        return backend_health()
     except:
         return False
 
@@ -43,42 +47,22 @@ def show_login_page():
                         "username": email,
                         "password": password
                     }
-                    response = requests.post(
-                        f"{API_BASE_URL}/api/auth/login",
-                        data=form_data,
-                        timeout=10
-                    )
+                    ok, data = api_post("/api/auth/login", data=form_data, timeout=10)
                     
-                    if response.status_code == 200:
-                        try:
-                            data = response.json()
-                            st.session_state.access_token = data["access_token"]
-                            st.session_state.authenticated = True
-                            
-                            # Get user info
-                            headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
-                            user_response = requests.get(
-                                f"{API_BASE_URL}/api/auth/me",
-                                headers=headers,
-                                timeout=10
-                            )
-                            if user_response.status_code == 200:
-                                st.session_state.user = user_response.json()
-                            
-                            st.success("Erfolgreich angemeldet!")
-                            st.rerun()
-                        except (ValueError, requests.exceptions.JSONDecodeError):
-                            st.error("Ungültige Antwort vom Backend. Bitte überprüfen Sie die Backend-Logs.")
+                    if ok:
+                        st.session_state.access_token = data["access_token"]
+                        st.session_state.authenticated = True
+                        
+                        # Get user info
+                        headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
+                        user_ok, user = api_get("/api/auth/me", headers=headers, timeout=10)
+                        if user_ok:
+                            st.session_state.user = user
+                        
+                        st.success("Erfolgreich angemeldet!")
+                        st.rerun()
                     else:
-                        try:
-                            error_detail = response.json().get('detail', 'Unbekannter Fehler')
-                        except (ValueError, requests.exceptions.JSONDecodeError):
-                            error_detail = f"HTTP {response.status_code}: {response.text[:100]}"
-                        st.error(f"Anmeldung fehlgeschlagen: {error_detail}")
-                except requests.exceptions.ConnectionError:
-                    st.error("Verbindungsfehler: Backend nicht erreichbar. Bitte starten Sie das Backend mit './run_backend.sh'")
-                except requests.exceptions.Timeout:
-                    st.error("Zeitüberschreitung: Das Backend antwortet nicht.")
+                        st.error(f"Anmeldung fehlgeschlagen: {data}")
                 except Exception as e:
                     st.error(f"Fehler: {str(e)}")
     
@@ -97,8 +81,10 @@ def show_login_page():
                     st.error("Passwort muss mindestens 6 Zeichen lang sein")
                 else:
                     try:
-                        response = requests.post(
-                            f"{API_BASE_URL}/api/auth/register",
+                        # The raw response is kept for the error details below
+                        response = request(
+                            "POST",
+                            "/api/auth/register",
                             json={"email": email, "password": password},
                             timeout=10
                         )
@@ -106,21 +92,18 @@ def show_login_page():
                         if response.status_code == 201:
                             st.success("Registrierung erfolgreich! Bitte melden Sie sich an.")
                         else:
-                            try:
-                                error_data = response.json()
-                                error_detail = error_data.get('detail', 'Unbekannter Fehler')
-                                # Show full error in expander for debugging
-                                with st.expander("Fehlerdetails anzeigen"):
-                                    st.json(error_data)
-                            except (ValueError, requests.exceptions.JSONDecodeError):
-                                error_detail = f"HTTP {response.status_code}: {response.text[:200]}"
-                                with st.expander("Fehlerdetails anzeigen"):
+                            error_detail = parse_error(response)
+                            # Show full error in expander for debugging
+                            with st.expander("Fehlerdetails anzeigen"):
+                                if "json" in response.headers.get("content-type", ""):
+                                    st.json(response.text)
+                                else:
                                     st.text(response.text)
                             st.error(f"Registrierung fehlgeschlagen: {error_detail}")
                     except requests.exceptions.ConnectionError:
-                        st.error("Verbindungsfehler: Backend nicht erreichbar. Bitte starten Sie das Backend mit './run_backend.sh'")
+                        st.error(CONNECTION_ERROR_MESSAGE)
                     except requests.exceptions.Timeout:
-                        st.error("Zeitüberschreitung: Das Backend antwortet nicht.")
+                        st.error(TIMEOUT_MESSAGE)
                     except Exception as e:
                         st.error(f"Fehler: {str(e)}")
 